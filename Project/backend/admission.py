@@ -0,0 +1,146 @@
+# admission.py
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+PRIORITY_USER = 0
+PRIORITY_ANONYMOUS = 1
+PRIORITY_NAMES = ("user", "anonymous")
+
+
+class Overloaded(Exception):
+    """Request shed by admission control; retry_after is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded concurrency for CPU-bound work, with a short two-class queue.
+
+    At most max_concurrent callers hold a slot; up to max_queue more wait,
+    authenticated (PRIORITY_USER) ones ahead of anonymous ones, FIFO within a
+    class. A full queue rejects straight away, except that an authenticated
+    caller evicts the newest anonymous waiter instead. Waiting longer than
+    queue_timeout also sheds the request. Slots are handed directly to the
+    next waiter on release, so a queued request can't be overtaken.
+
+    Runs on one event loop; max_concurrent <= 0 disables the limit.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int = 16, queue_timeout: float = 2.0,
+                 retry_after: int = 1):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._waiters = tuple(deque() for _ in PRIORITY_NAMES)
+        self.reset_stats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    @property
+    def queued(self) -> int:
+        return sum(self._waiting(w) for w in self._waiters)
+
+    @staticmethod
+    def _waiting(waiters) -> int:
+        # a cancelled or timed-out waiter stays queued until its task cleans up
+        return sum(not waiter.done() for waiter in waiters)
+
+    def _evict_anonymous(self) -> bool:
+        """Shed the newest anonymous waiter still waiting, if there is one."""
+        waiters = self._waiters[PRIORITY_ANONYMOUS]
+        for waiter in reversed(waiters):
+            if not waiter.done():
+                waiters.remove(waiter)
+                waiter.set_exception(self._shed(PRIORITY_ANONYMOUS, "evicted"))
+                return True
+        return False
+
+    def reset_stats(self):
+        self.counts = {name: {"admitted": 0, "queued": 0, "rejected": 0, "evicted": 0, "timed_out": 0}
+                       for name in PRIORITY_NAMES}
+        self.recent_waits = deque(maxlen=1000)
+
+    def _shed(self, priority: int, reason: str) -> Overloaded:
+        self.counts[PRIORITY_NAMES[priority]][reason] += 1
+        return Overloaded(reason, self.retry_after)
+
+    async def acquire(self, priority: int = PRIORITY_ANONYMOUS):
+        """Wait for a slot; raises Overloaded if the request is shed."""
+        counts = self.counts[PRIORITY_NAMES[priority]]
+        if not self.enabled or (self.in_flight < self.max_concurrent and not self.queued):
+            self.in_flight += 1
+            counts["admitted"] += 1
+            return
+
+        if self.queued >= self.max_queue:
+            if priority == PRIORITY_ANONYMOUS or not self._evict_anonymous():
+                raise self._shed(priority, "rejected")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        counts["queued"] += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # the slot was handed over just as we gave up
+                self.release()
+            elif waiter in self._waiters[priority]:
+                self._waiters[priority].remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._shed(priority, "timed_out")
+            raise
+        counts["admitted"] += 1
+        self.recent_waits.append(time.monotonic() - start)
+
+    def release(self):
+        if self.enabled:
+            for waiters in self._waiters:
+                while waiters:
+                    waiter = waiters.popleft()
+                    if not waiter.done():
+                        waiter.set_result(None)
+                        return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_ANONYMOUS):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, func: Callable, *args, priority: int = PRIORITY_ANONYMOUS, **kwargs):
+        """func(*args, **kwargs) in the threadpool once admitted, keeping the event loop free."""
+        async with self.slot(priority):
+            return await run_in_threadpool(func, *args, **kwargs)
+
+    def stats(self) -> dict:
+        waits = np.array(self.recent_waits) * 1000
+        shed = sum(c["rejected"] + c["evicted"] + c["timed_out"] for c in self.counts.values())
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "queued": {name: self._waiting(w) for name, w in zip(PRIORITY_NAMES, self._waiters)},
+            "shed": shed,
+            "by_priority": self.counts,
+            "queue_wait_p50_ms": round(float(np.percentile(waits, 50)), 3) if waits.size else None,
+            "queue_wait_p99_ms": round(float(np.percentile(waits, 99)), 3) if waits.size else None,
+        }
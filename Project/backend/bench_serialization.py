@@ -0,0 +1,97 @@
+# bench_serialization.py
+"""Per-message cost of encoding a chat history response.
+
+Compares the previous path (dict(row) -> response_model validation ->
+jsonable_encoder -> json.dumps) with json_response (row_dict -> orjson).
+Needs no database. Run from the project root:
+
+    python3 -m Project.backend.bench_serialization
+"""
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from .serialization import ORJSONResponse, rows_list, row_dict
+
+MESSAGE_FIELDS = ("id", "chat_id", "user_id", "role", "content", "created_at")
+CHAT_FIELDS = ("id", "user_id", "title", "created_at")
+
+
+# same shapes as ChatOut / MessageOut / ChatWithMessagesOut in main.py
+class ChatOut(BaseModel):
+    id: int
+    user_id: int
+    title: Optional[str]
+    created_at: datetime
+
+
+class MessageOut(BaseModel):
+    id: int
+    chat_id: int
+    user_id: Optional[int]
+    role: str
+    content: str
+    created_at: datetime
+
+
+class ChatWithMessagesOut(BaseModel):
+    chat: ChatOut
+    messages: List[MessageOut]
+
+
+def fake_history(n):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    chat = {"id": 1, "user_id": 1, "title": "Headache and fever", "created_at": start}
+    msgs = [
+        {
+            "id": i,
+            "chat_id": 1,
+            "user_id": 1,
+            "role": "user" if i % 2 else "assistant",
+            "content": "I have had a headache, mild fever and some nausea since yesterday " * 3,
+            "created_at": start + timedelta(seconds=i),
+        }
+        for i in range(n)
+    ]
+    return chat, msgs
+
+
+def pydantic_path(chat, msgs):
+    data = {"chat": dict(chat), "messages": [dict(m) for m in msgs]}
+    validated = ChatWithMessagesOut.model_validate(data)
+    return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+def orjson_path(chat, msgs):
+    return ORJSONResponse({
+        "chat": row_dict(chat, CHAT_FIELDS),
+        "messages": rows_list(msgs, MESSAGE_FIELDS),
+    }).body
+
+
+def per_message_us(fn, chat, msgs, min_time=0.5):
+    loops, elapsed = 0, 0.0
+    start = time.perf_counter()
+    while elapsed < min_time:
+        fn(chat, msgs)
+        loops += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / loops / max(len(msgs), 1) * 1e6
+
+
+def main():
+    print(f"{'messages':>10} {'pydantic+json us/msg':>22} {'orjson us/msg':>15} {'speedup':>9}")
+    for n in (10, 100, 1000, 10000):
+        chat, msgs = fake_history(n)
+        assert json.loads(pydantic_path(chat, msgs)) == json.loads(orjson_path(chat, msgs))
+        slow = per_message_us(pydantic_path, chat, msgs)
+        fast = per_message_us(orjson_path, chat, msgs)
+        print(f"{n:>10} {slow:>22.2f} {fast:>15.2f} {slow / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
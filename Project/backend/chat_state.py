@@ -0,0 +1,101 @@
+# chat_state.py
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from .models import chats
+
+
+class ChatSymptomState:
+    """Symptoms accumulated over a chat, kept as a packed bitset.
+
+    The bitset (one bit per symptom, ceil(n/8) bytes) lives in
+    ``chats.symptom_state`` and is the source of truth. Writes are
+    conditional on the value that was read, so concurrent turns (in this
+    process or another worker) never overwrite each other's symptoms; a
+    lost race re-reads and merges again. A stored bitset of the wrong size
+    (the symptom list changed) is treated as empty.
+
+    With max_entries > 0 an in-memory LRU keyed by (user_id, chat_id) saves
+    the read. It can be stale when other workers serve the same chat, which
+    only delays their symptoms until this process next writes, so it is
+    off by default.
+    """
+
+    def __init__(self, n_symptoms: int, max_entries: int = 0):
+        self.n_symptoms = n_symptoms
+        self.n_bytes = (n_symptoms + 7) // 8
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+
+    def pack(self, indices) -> bytes:
+        bits = np.zeros(self.n_bytes * 8, dtype=np.uint8)
+        bits[list(indices)] = 1
+        return np.packbits(bits).tobytes()
+
+    def unpack(self, state: Optional[bytes]) -> List[int]:
+        if not state or len(state) != self.n_bytes:
+            return []
+        bits = np.unpackbits(np.frombuffer(state, dtype=np.uint8))[:self.n_symptoms]
+        return np.flatnonzero(bits).tolist()
+
+    def _remember(self, key, state: bytes):
+        if self.max_entries <= 0:
+            return
+        self._cache[key] = state
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def remember(self, user_id: int, chat_id: int, state: bytes):
+        """Cache the state a chat was just written with (e.g. a newly created chat)."""
+        self._remember((user_id, chat_id), state)
+
+    def forget(self, chat_id: int):
+        for key in [k for k in self._cache if k[1] == chat_id]:
+            del self._cache[key]
+
+    async def merge(self, database, user_id: int, chat_id: int, indices) -> Optional[List[int]]:
+        """OR new symptom indices into the chat's state and return all of them.
+
+        Returns None if the chat doesn't exist or belongs to someone else.
+        """
+        key = (user_id, chat_id)
+        state = self._cache.pop(key, None)
+        while True:
+            if state is None:
+                row = await database.fetch_one(
+                    select(chats.c.id, chats.c.symptom_state)
+                    .where(chats.c.id == chat_id)
+                    .where(chats.c.user_id == user_id)
+                )
+                if not row:
+                    return None
+                state = row["symptom_state"]
+
+            current = self.unpack(state)
+            merged = sorted(set(current).union(indices))
+            if merged == current:
+                break
+
+            # compare-and-swap: only applies if nobody changed the state since it was read
+            new_state = self.pack(merged)
+            same_state = chats.c.symptom_state.is_(None) if state is None else chats.c.symptom_state == state
+            updated = await database.fetch_one(
+                chats.update()
+                .where(chats.c.id == chat_id)
+                .where(chats.c.user_id == user_id)
+                .where(same_state)
+                .values(symptom_state=new_state)
+                .returning(chats.c.id)
+            )
+            if updated:
+                state = new_state
+                break
+            state = None
+
+        if state is not None:
+            self._remember(key, bytes(state))
+        return merged
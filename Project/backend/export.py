@@ -0,0 +1,74 @@
+# export.py
+"""Streaming NDJSON export of a user's chats and messages.
+
+One ordered chats LEFT JOIN messages query is read through
+``database.iterate`` (a server-side cursor on Postgres), so memory stays
+flat however long the history is. Output lines::
+
+    {"type": "user", ...profile}
+    {"type": "chat", "id", "title", "created_at"}
+    {"type": "message", "id", "chat_id", "role", "content", "created_at"}
+    ...
+
+Each chat line is followed by its messages, oldest first.
+"""
+import zlib
+from typing import AsyncIterator
+
+from sqlalchemy import select
+
+from .models import chats, messages
+from .serialization import dumps
+
+CHUNK_SIZE = 64 * 1024
+
+_EXPORT_QUERY_COLUMNS = (
+    chats.c.id.label("chat_id"),
+    chats.c.title.label("chat_title"),
+    chats.c.created_at.label("chat_created_at"),
+    messages.c.id.label("message_id"),
+    messages.c.role,
+    messages.c.content,
+    messages.c.created_at.label("message_created_at"),
+)
+
+
+def export_query(user_id: int):
+    return (
+        select(*_EXPORT_QUERY_COLUMNS)
+        .select_from(chats.outerjoin(messages, messages.c.chat_id == chats.c.id))
+        .where(chats.c.user_id == user_id)
+        .order_by(chats.c.id, messages.c.id)
+    )
+
+
+async def export_lines(database, user: dict) -> AsyncIterator[bytes]:
+    """NDJSON for the user's profile, chats and messages, batched into ~CHUNK_SIZE pieces."""
+    buffer = bytearray(dumps({"type": "user", **user}) + b"\n")
+    current_chat = None
+
+    async for row in database.iterate(export_query(user["id"])):
+        if row["chat_id"] != current_chat:
+            current_chat = row["chat_id"]
+            buffer += dumps({"type": "chat", "id": current_chat, "title": row["chat_title"],
+                             "created_at": row["chat_created_at"]}) + b"\n"
+        if row["message_id"] is not None:
+            buffer += dumps({"type": "message", "id": row["message_id"], "chat_id": current_chat,
+                             "role": row["role"], "content": row["content"],
+                             "created_at": row["message_created_at"]}) + b"\n"
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+
+    if buffer:
+        yield bytes(buffer)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Gzip a byte stream on the fly (a single gzip member)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
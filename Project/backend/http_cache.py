@@ -0,0 +1,66 @@
+# http_cache.py
+import hashlib
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import Response
+
+# bodies already in a compressed format; gzipping them again only costs CPU
+COMPRESSED_CONTENT_TYPES = frozenset({"application/gzip", "application/x-gzip", "application/zip"})
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag from version parts (weak: the body may be re-encoded, e.g. gzipped)."""
+    digest = hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+def cache_headers(etag: str, cache_control: str) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, cache_control))
+
+
+class SelectiveGZipMiddleware:
+    """GZipMiddleware that sends COMPRESSED_CONTENT_TYPES responses straight through.
+
+    Starlette versions before the content-type exclusions only skip responses
+    that set Content-Encoding, so e.g. an application/gzip export would be
+    gzipped a second time.
+    """
+
+    def __init__(self, app, **gzip_options):
+        self.app = app
+        self.gzip_options = gzip_options
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def app(scope, receive, gzip_send):
+            bypass = False
+
+            async def route(message):
+                nonlocal bypass
+                if message["type"] == "http.response.start":
+                    content_type = Headers(raw=message["headers"]).get("content-type", "")
+                    bypass = content_type.partition(";")[0].strip().lower() in COMPRESSED_CONTENT_TYPES
+                await (send if bypass else gzip_send)(message)
+
+            await self.app(scope, receive, route)
+
+        await GZipMiddleware(app, **self.gzip_options)(scope, receive, send)
@@ -0,0 +1,38 @@
+# input_filter.py
+import re
+
+# Input policies for free-text symptom input:
+#   reject - refuse input containing SQL statement/comment tokens
+#   strip  - drop those tokens and keep going
+INPUT_POLICIES = ("reject", "strip")
+
+# SQL comment/terminator tokens and statement keywords (whole words only, so
+# "updated" or "selection" are fine). Quotes are not listed: "I can't sleep"
+# is ordinary input and punctuation is dropped by normalization anyway.
+_SUSPICIOUS = r"--|/\*|\*/|;|\b(?:drop|delete|update|insert|union|select)\b"
+
+_SUSPICIOUS_RE = re.compile(_SUSPICIOUS, re.IGNORECASE)
+_SEPARATOR_RE = re.compile(r"\W+")
+# strip policy: suspicious tokens and separators collapse to one space in a single pass
+_STRIP_RE = re.compile(r"(?:" + _SUSPICIOUS + r"|\W)+", re.IGNORECASE)
+
+
+class InputRejected(ValueError):
+    pass
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, turn punctuation/whitespace runs into single spaces, trim."""
+    return _SEPARATOR_RE.sub(" ", text).strip().lower()
+
+
+def normalize_input(text: str, policy: str = "reject") -> str:
+    """Apply the input policy and return the text normalized for symptom matching.
+
+    Raises InputRejected under the reject policy.
+    """
+    if policy == "strip":
+        return _STRIP_RE.sub(" ", text).strip().lower()
+    if _SUSPICIOUS_RE.search(text):
+        raise InputRejected("Invalid characters in input")
+    return normalize_text(text)
@@ -1,14 +1,18 @@
-from fastapi import FastAPI, Form, HTTPException, Header, Depends, BackgroundTasks, Query
+from fastapi import FastAPI, Form, HTTPException, Header, Depends, BackgroundTasks, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import pickle
-import numpy as np
+import asyncio
+import hashlib
+import time
 import re
 import os
 import pandas as pd 
 import sqlalchemy
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, ValidationError
 from datetime import date, datetime
 from typing import Optional, List, Dict, Any
+from functools import partial
 from sqlalchemy import select, func, text
 from .auth_utils import decode_access_token
 from .models import chats, messages, users  # ensure users imported
@@ -22,6 +26,19 @@ from .models import chats, messages, users  # ensure users imported
 from .db import database, metadata, engine
 from .models import users
 from .auth_utils import hash_password, verify_password, create_access_token
+from .rate_limit import TokenBucketLimiter, RateLimitMiddleware, BodySizeLimitMiddleware
+from .input_filter import INPUT_POLICIES, InputRejected, normalize_input, normalize_text
+from .symptom_vocab import build_vocabulary, load_synonyms, symptom_phrase
+from .symptom_suggest import build_suggester
+from .next_question import build_question_engine
+from .model_artifact import is_artifact, load_model
+from .model_router import ModelRouter, UnknownModel
+from .chat_state import ChatSymptomState
+from .serialization import dumps, json_response, row_dict, rows_list
+from .search import SEARCH_FIELDS, search_messages, search_terms
+from .export import export_lines, gzip_stream
+from .http_cache import make_etag, etag_matches, cache_headers, not_modified, SelectiveGZipMiddleware
+from .admission import AdmissionController, Overloaded, PRIORITY_ANONYMOUS, PRIORITY_USER
 
 
 # -----------------------------------------------------
@@ -29,9 +46,35 @@ from .auth_utils import hash_password, verify_password, create_access_token
 # -----------------------------------------------------
 app = FastAPI(title="Disease Prediction API", version="1.0")
 
+# Compress responses above GZIP_MIN_SIZE bytes for clients that accept gzip
+GZIP_MIN_SIZE = int(os.environ.get("GZIP_MIN_SIZE", 1000))
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=6)
+
+# Rate limit + body size guard (added before CORS so CORS stays outermost
+# and 429/413 responses still carry CORS headers)
+RATE_LIMIT_PER_MINUTE = int(os.environ.get("RATE_LIMIT_PER_MINUTE", 60))
+MAX_BODY_SIZE = int(os.environ.get("MAX_BODY_SIZE", 5 * 1024 * 1024))
+
+rate_limiter = TokenBucketLimiter(RATE_LIMIT_PER_MINUTE)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=MAX_BODY_SIZE)
+
+# Admission control for inference: at most INFERENCE_CONCURRENCY predictions run
+# at once (0 = no limit), up to INFERENCE_QUEUE_SIZE wait (signed-in users
+# first) for at most INFERENCE_QUEUE_TIMEOUT seconds; the rest get 503.
+INFERENCE_CONCURRENCY = int(os.environ.get("INFERENCE_CONCURRENCY", 4))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", 16))
+INFERENCE_QUEUE_TIMEOUT = float(os.environ.get("INFERENCE_QUEUE_TIMEOUT", 2))
+INFERENCE_RETRY_AFTER = int(os.environ.get("INFERENCE_RETRY_AFTER", 1))
+
+admission = AdmissionController(INFERENCE_CONCURRENCY, INFERENCE_QUEUE_SIZE,
+                                INFERENCE_QUEUE_TIMEOUT, INFERENCE_RETRY_AFTER)
+
+ALLOWED_ORIGINS = [o.strip() for o in os.environ.get("ALLOWED_ORIGINS", "*").split(",") if o.strip()]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -41,10 +84,15 @@ app.add_middleware(
 # LOAD MODEL + SYMPTOMS - SECURE PATH HANDLING
 # -----------------------------------------------------
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Project/model: the trained artifact and files shipped with the backend (synonym table)
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model")
 
 MODEL_PATH = os.environ.get("MODEL_PATH")
 if not MODEL_PATH:
-    MODEL_PATH = os.path.join(BASE_DIR, "model", "disease_model.pkl")
+    # prefer the binary artifact (where train_model.py writes it), fall back to the legacy pickle
+    MODEL_PATH = os.path.join(MODEL_DIR, "disease_model.dpm")
+    if not os.path.exists(MODEL_PATH):
+        MODEL_PATH = os.path.join(BASE_DIR, "model", "disease_model.pkl")
 
 SYMPTOM_LIST_PATH = os.environ.get("SYMPTOM_LIST_PATH")
 if not SYMPTOM_LIST_PATH:
@@ -59,7 +107,7 @@ def validate_path(path: str, allowed_dirs: list) -> bool:
             return True
     return False
 
-ALLOWED_DATA_DIRS = [os.path.realpath(os.path.dirname(MODEL_PATH))]
+ALLOWED_DATA_DIRS = [os.path.realpath(os.path.dirname(MODEL_PATH)), os.path.realpath(MODEL_DIR)]
 
 if not os.path.exists(MODEL_PATH):
     raise FileNotFoundError(f"Model not found: {MODEL_PATH}")
@@ -67,24 +115,81 @@ if not os.path.exists(MODEL_PATH):
 if not validate_path(MODEL_PATH, ALLOWED_DATA_DIRS):
     raise PermissionError(f"Model path not in allowed directory: {MODEL_PATH}")
 
-if not os.path.exists(SYMPTOM_LIST_PATH):
-    raise FileNotFoundError(f"Symptom list not found: {SYMPTOM_LIST_PATH}")
+MODEL_IS_ARTIFACT = is_artifact(MODEL_PATH)
+
+# artifacts carry their own feature list; legacy pickles need symptom_list.pkl
+if not MODEL_IS_ARTIFACT:
+    if not os.path.exists(SYMPTOM_LIST_PATH):
+        raise FileNotFoundError(f"Symptom list not found: {SYMPTOM_LIST_PATH}")
 
-if not validate_path(SYMPTOM_LIST_PATH, ALLOWED_DATA_DIRS):
-    raise PermissionError(f"Symptom list path not in allowed directory: {SYMPTOM_LIST_PATH}")
+    if not validate_path(SYMPTOM_LIST_PATH, ALLOWED_DATA_DIRS):
+        raise PermissionError(f"Symptom list path not in allowed directory: {SYMPTOM_LIST_PATH}")
 
-with open(MODEL_PATH, "rb") as f:
-    model = pickle.load(f)
+    with open(SYMPTOM_LIST_PATH, "rb") as f:
+        SYMPTOMS = pickle.load(f)
 
-with open(SYMPTOM_LIST_PATH, "rb") as f:
-    SYMPTOMS = pickle.load(f)
+# a pickle fitted without feature names takes them from symptom_list.pkl
+model = load_model(MODEL_PATH, feature_names=None if MODEL_IS_ARTIFACT else SYMPTOMS)
+
+if MODEL_IS_ARTIFACT:
+    SYMPTOMS = list(model.feature_names_in_)
 
 SYMPTOMS = [s.lower().strip() for s in SYMPTOMS]
 
-# Load features from model
-model_feature_names = None
-if hasattr(model, "feature_names_in_"):
-    model_feature_names = [s.lower().strip() for s in model.feature_names_in_]
+# Synonym table (phrase,symptom CSV), shipped in Project/model
+SYMPTOM_SYNONYMS_PATH = os.environ.get("SYMPTOM_SYNONYMS_PATH")
+if SYMPTOM_SYNONYMS_PATH and not os.path.exists(SYMPTOM_SYNONYMS_PATH):
+    raise FileNotFoundError(f"Synonyms not found: {SYMPTOM_SYNONYMS_PATH}")
+if not SYMPTOM_SYNONYMS_PATH:
+    SYMPTOM_SYNONYMS_PATH = os.path.join(MODEL_DIR, "symptom_synonyms.csv")
+
+if not validate_path(SYMPTOM_SYNONYMS_PATH, ALLOWED_DATA_DIRS):
+    raise PermissionError(f"Synonyms path not in allowed directory: {SYMPTOM_SYNONYMS_PATH}")
+
+if not os.path.exists(SYMPTOM_SYNONYMS_PATH):
+    print("Synonyms not found, matching symptom names only:", SYMPTOM_SYNONYMS_PATH)
+
+symptom_vocab = build_vocabulary(SYMPTOMS, SYMPTOM_SYNONYMS_PATH)
+
+# -----------------------------------------------------
+# MODEL ROUTING - extra named models (regional datasets, A/B variants)
+# -----------------------------------------------------
+def parse_pairs(value: str) -> Dict[str, str]:
+    """Parse "a=x,b=y" into {"a": "x", "b": "y"}."""
+    pairs = {}
+    for item in value.split(","):
+        if item.strip():
+            key, sep, val = item.partition("=")
+            if not sep or not key.strip() or not val.strip():
+                raise RuntimeError(f"Expected name=value, got {item.strip()!r}")
+            pairs[key.strip()] = val.strip()
+    return pairs
+
+# name=path of models loaded on first use, and nationality=name routes
+MODEL_REGISTRY = parse_pairs(os.environ.get("MODEL_REGISTRY", ""))
+MODEL_ROUTES = parse_pairs(os.environ.get("MODEL_ROUTES", ""))
+# memory budget for loaded models (bytes, 0 = unlimited); the default model is always kept
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("MODEL_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# (symptom set, explain) -> prediction, per model
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 4096))
+
+for _name, _path in MODEL_REGISTRY.items():
+    if not os.path.exists(_path):
+        raise FileNotFoundError(f"Model {_name!r} not found: {_path}")
+    if not validate_path(_path, ALLOWED_DATA_DIRS):
+        raise PermissionError(f"Model {_name!r} path not in allowed directory: {_path}")
+
+DEFAULT_MODEL = "default"
+model_router = ModelRouter(
+    SYMPTOMS, DEFAULT_MODEL, {DEFAULT_MODEL: MODEL_PATH, **MODEL_REGISTRY},
+    routes=MODEL_ROUTES, max_bytes=MODEL_CACHE_MAX_BYTES, cache_size=PREDICTION_CACHE_SIZE,
+    loader=partial(load_model, feature_names=SYMPTOMS),
+)
+default_model = model_router.add(DEFAULT_MODEL, model)
+
+# Per-chat accumulated symptoms (bitset in chats.symptom_state, optional in-memory LRU)
+CHAT_STATE_CACHE_SIZE = int(os.environ.get("CHAT_STATE_CACHE_SIZE", 0))
+chat_symptom_state = ChatSymptomState(len(SYMPTOMS), CHAT_STATE_CACHE_SIZE)
 
 # -----------------------------------------------------
 # CSV for description + precautions
@@ -107,38 +212,83 @@ details_df = pd.read_csv(CSV_PATH)
 
 print("Loaded columns:", details_df.columns.tolist())
 
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def build_details_index(df):
+    """disease (lowercased) -> (description, precautions); None if the CSV has no Disease column"""
+    df = df.rename(columns=lambda x: x.strip().lower())
+    if "disease" not in df.columns:
+        return None
+    index = {}
+    for item in df.to_dict("records"):
+        # first row wins for duplicated diseases
+        key = str(item["disease"]).strip().lower()
+        if key in index:
+            continue
+        precautions = [str(item.get(f"precaution_{i}", "")) for i in range(1, 5)]
+        precautions = [p for p in precautions if p and p.strip()]
+        index[key] = (str(item.get("description", "No description found")), precautions)
+    return index
+
+DETAILS_INDEX = build_details_index(details_df)
+
+# /get_details only changes when the CSV or the model does
+MODEL_VERSION = getattr(model, "checksum", None) or file_digest(MODEL_PATH)
+DETAILS_ETAG = make_etag(file_digest(CSV_PATH), MODEL_VERSION)
+REFERENCE_CACHE_MAX_AGE = int(os.environ.get("REFERENCE_CACHE_MAX_AGE", 3600))
+DETAILS_CACHE_CONTROL = f"public, max-age={REFERENCE_CACHE_MAX_AGE}"
+# per-user lists: caches may keep them but must revalidate (cheap 304) every time
+CHATS_CACHE_CONTROL = "private, no-cache"
+
+# Symptom autocomplete, ranked by severity weight then training-set frequency
+SEVERITY_PATH = os.path.join(DATA_DIR, "Symptom-severity.csv")
+TRAINING_PATH = os.path.join(DATA_DIR, "Training.csv")
+symptom_suggester = build_suggester(
+    SYMPTOMS, SEVERITY_PATH, TRAINING_PATH,
+    load_synonyms(SYMPTOM_SYNONYMS_PATH) if os.path.exists(SYMPTOM_SYNONYMS_PATH) else None,
+)
+
+# Next-question suggestions from disease x symptom rates in the training set
+# keyed by phrase, so "skin rash", "skin_rash" and "spotting_ urination" all resolve
+SYMPTOM_POSITION = {symptom_phrase(s): i for i, s in enumerate(SYMPTOMS)}
+question_engine = build_question_engine(SYMPTOMS, TRAINING_PATH)
+if question_engine is None:
+    print("Training data not found, next-question suggestions disabled:", TRAINING_PATH)
+
+# -----------------------------------------------------
+# INPUT POLICY for free-text prediction input (reject | strip)
+# -----------------------------------------------------
+INPUT_POLICY = os.environ.get("INPUT_POLICY", "reject").lower()
+if INPUT_POLICY not in INPUT_POLICIES:
+    raise RuntimeError(f"INPUT_POLICY must be one of {INPUT_POLICIES}, got {INPUT_POLICY!r}")
+
 
 
 # -----------------------------------------------------
 # HELPERS
 # -----------------------------------------------------
 def preprocess(text):
-    text = text.lower()
-    text = re.sub(r"[^\w\s]", " ", text)
-    return re.sub(r"\s+", " ", text).strip()
+    return normalize_text(text)
 
 
-def build_vector_from_text(text):
-    text = preprocess(text)
-    found = []
+def build_vector_from_text(text, normalized=False):
+    """Match symptoms in text. Pass normalized=True if text already went through normalize_input."""
+    if not normalized:
+        text = preprocess(text)
 
-    for s in SYMPTOMS:
-        normalized = s.replace("_", " ")
-        if normalized in text:
-            found.append(s)
+    idx = symptom_vocab.match(text)
+    return build_vector_from_indices(idx), [SYMPTOMS[i] for i in idx]
 
-    vec = [1 if s in found else 0 for s in SYMPTOMS]
-    arr = np.array(vec).reshape(1, -1)
 
-    if model_feature_names:
-        mapping = {s: (1 if s in found else 0) for s in SYMPTOMS}
-        aligned = []
-        for name in model_feature_names:
-            key = name.replace(" ", "_")
-            aligned.append(mapping.get(key, 0))
-        arr = np.array(aligned).reshape(1, -1)
+def build_vector_from_indices(idx):
+    """Default model's input row for the given positions in SYMPTOMS."""
+    return default_model.vector(idx)
 
-    return arr, found
 
 # create tables if not exists (optional)
 def create_tables():
@@ -204,18 +354,47 @@ class UserProfileUpdate(BaseModel):
 
 class PredictionIn(BaseModel):
     user_input: str = Field(..., min_length=1, max_length=2000)
+    # send only the new message; symptoms from earlier turns come from the chat's state
+    chat_id: Optional[int] = None
+    # also return how much each matched symptom pushed towards the predicted disease
+    explain: bool = False
+    # registered model name; by default the user's nationality route (or the default model)
+    model: Optional[str] = Field(None, max_length=100)
+    # also suggest the most informative symptom to ask about next
+    suggest_next: bool = False
 
 class PredictionOut(BaseModel):
     user_input: str
     predicted_disease: str
     probability: Optional[float]
     matched_symptoms: List[str]
+    accumulated_symptoms: Optional[List[str]] = None
+    contributions: Optional[Dict[str, float]] = None
+    model: Optional[str] = None
+    next_question: Optional[Dict[str, Any]] = None
+
+class NextQuestionIn(BaseModel):
+    # symptom names the patient has, and ones already asked about and ruled out
+    symptoms: List[str] = Field(default_factory=list, max_length=200)
+    absent: List[str] = Field(default_factory=list, max_length=200)
+    top: int = Field(3, ge=1, le=20)
 
 class DiseaseDetailsOut(BaseModel):
     disease: str
     description: str
     precautions: List[str]
 
+# Columns returned to clients. DB rows for these are encoded straight to JSON
+# (json_response) instead of being re-validated through the response models above.
+USER_COLUMNS = (users.c.id, users.c.full_name, users.c.email, users.c.dob,
+                users.c.gender, users.c.nationality, users.c.created_at)
+CHAT_COLUMNS = (chats.c.id, chats.c.user_id, chats.c.title, chats.c.created_at)
+MESSAGE_COLUMNS = (messages.c.id, messages.c.chat_id, messages.c.user_id,
+                   messages.c.role, messages.c.content, messages.c.created_at)
+USER_FIELDS = tuple(c.name for c in USER_COLUMNS)
+CHAT_FIELDS = tuple(c.name for c in CHAT_COLUMNS)
+MESSAGE_FIELDS = tuple(c.name for c in MESSAGE_COLUMNS)
+
 # -----------------------------------------------------
 # ROUTES
 # -----------------------------------------------------
@@ -251,14 +430,11 @@ async def register(payload: RegisterIn):
         nationality=payload.nationality,
         email=payload.email,
         password_hash=hashed,
-    ).returning(
-        users.c.id, users.c.full_name, users.c.email, users.c.dob,
-        users.c.gender, users.c.nationality, users.c.created_at
-    )
+    ).returning(*USER_COLUMNS)
 
     created = await database.fetch_one(insert_query)
 
-    return dict(created)
+    return json_response(row_dict(created, USER_FIELDS), status_code=201)
 
 # Login route
 @app.post("/auth/login", response_model=LoginOut)
@@ -272,17 +448,12 @@ async def login(payload: LoginIn):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     token = create_access_token(subject=str(user_row["id"]))
-    user_out = {
-        "id": user_row["id"],
-        "full_name": user_row["full_name"],
-        "email": user_row["email"],
-        "dob": str(user_row["dob"]),
-        "gender": user_row["gender"],
-        "nationality": user_row["nationality"],
-        "created_at": str(user_row["created_at"]),
-    }
 
-    return {"access_token": token, "user": user_out}
+    return json_response({
+        "access_token": token,
+        "token_type": "bearer",
+        "user": row_dict(user_row, USER_FIELDS),
+    })
 
 # dependency to extract current user id from Authorization header
 async def get_current_user(authorization: Optional[str] = Header(None)):
@@ -291,6 +462,10 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
     if not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="Invalid auth scheme")
     token = authorization.split(" ", 1)[1].strip()
+    return await user_from_token(token)
+
+async def user_from_token(token: str):
+    """User row for a JWT; HTTPException(401) if it's invalid or the user is gone"""
     try:
         payload = decode_access_token(token)
         sub = payload.get("sub")
@@ -306,15 +481,21 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-@app.post("/predict_text")
-async def predict_text(payload: PredictionIn, authorization: Optional[str] = Header(None)):
-    user_id = None
-    if authorization:
-        try:
-            user = await get_current_user(authorization)
-            user_id = user["id"]
-        except HTTPException:
-            pass
+def chat_title(text: str) -> str:
+    """Title for a chat started by this message (same rule as the frontend)"""
+    return text[:50] + ("..." if len(text) > 50 else "")
+
+
+async def run_prediction(payload: PredictionIn, user=None, new_chat_title: Optional[str] = None):
+    """Validate input, match symptoms, update the chat's state and predict.
+
+    Shared by /predict_text and /ws/chat. With new_chat_title and no
+    payload.chat_id, a chat is created for the user, starting from this
+    message's symptoms. Returns (prediction dict, created chat or None);
+    raises HTTPException for bad input and 503 when inference is overloaded.
+    """
+    user_id = user["id"] if user is not None else None
+    nationality = row_dict(user).get("nationality") if user is not None else None
 
     user_input = payload.user_input
     
@@ -326,35 +507,121 @@ async def predict_text(payload: PredictionIn, authorization: Optional[str] = Hea
     if len(user_input) > 2000:
         raise HTTPException(status_code=400, detail="Input too long (max 2000 characters)")
     
-    # Check for SQL injection patterns
-    dangerous_patterns = ["'", "\"", ";", "--", "/*", "*/", "DROP", "DELETE", "UPDATE", "INSERT", "UNION", "SELECT"]
-    input_upper = user_input.upper()
-    for pattern in dangerous_patterns:
-        if pattern in input_upper:
-            raise HTTPException(status_code=400, detail="Invalid characters in input")
-
-    arr, matched = build_vector_from_text(user_input)
-
-    if hasattr(model, "predict_proba"):
-        probs = model.predict_proba(arr)
-        idx = np.argmax(probs)
-        pred = model.classes_[idx]
-        prob = float(probs[0][idx])
+    # Validate against INPUT_POLICY and normalize in one go; the matcher reuses the result
+    try:
+        normalized = normalize_input(user_input, INPUT_POLICY)
+    except InputRejected:
+        raise HTTPException(status_code=400, detail="Invalid characters in input")
+
+    try:
+        model_name = model_router.resolve(payload.model, nationality)
+    except UnknownModel:
+        raise HTTPException(status_code=404, detail="Unknown model")
+
+    matched_idx = symptom_vocab.match(normalized)
+    matched = [SYMPTOMS[i] for i in matched_idx]
+    accumulated = None
+    chat = None
+    new_chat = payload.chat_id is None and new_chat_title is not None and user_id is not None
+
+    if new_chat:
+        all_idx = matched_idx
+        accumulated = matched
+    elif payload.chat_id is not None:
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Authentication required for chat predictions")
+        all_idx = await chat_symptom_state.merge(database, user_id, payload.chat_id, matched_idx)
+        if all_idx is None:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        accumulated = [SYMPTOMS[i] for i in all_idx]
     else:
-        pred = model.predict(arr)[0]
-        prob = None
+        all_idx = matched_idx
+
+    def infer():
+        # a cold model load (mmap + checksum) happens here too, off the event loop
+        served = model_router.get(model_name)
+        pred, prob, contributions = served.predict(all_idx, explain=payload.explain)
+        next_question = None
+        if payload.suggest_next and question_engine is not None:
+            suggestion = question_engine.suggest(all_idx)["questions"]
+            next_question = suggestion[0] if suggestion else None
+        return served, pred, prob, contributions, next_question
+
+    try:
+        served, pred, prob, contributions, next_question = await admission.run(
+            infer, priority=PRIORITY_USER if user is not None else PRIORITY_ANONYMOUS)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail="Server busy, please retry shortly",
+                            headers={"Retry-After": str(e.retry_after)})
+
+    # created only once the prediction is in, so a shed request leaves no empty chat
+    if new_chat:
+        state = chat_symptom_state.pack(matched_idx)
+        chat = row_dict(await database.fetch_one(
+            chats.insert().values(user_id=user_id, title=new_chat_title, symptom_state=state)
+            .returning(*CHAT_COLUMNS)
+        ), CHAT_FIELDS)
+        chat_symptom_state.remember(user_id, chat["id"], state)
+
+    return {
+        "user_input": user_input,
+        "predicted_disease": pred,
+        "probability": prob,
+        "matched_symptoms": matched,
+        "accumulated_symptoms": accumulated,
+        "contributions": contributions,
+        "model": served.name,
+        "next_question": next_question,
+    }, chat
+
+
+@app.post("/predict_text", response_model=PredictionOut)
+async def predict_text(payload: PredictionIn, authorization: Optional[str] = Header(None)):
+    user = None
+    if authorization:
+        try:
+            user = await get_current_user(authorization)
+        except HTTPException:
+            pass
 
-    return PredictionOut(
-        user_input=user_input,
-        predicted_disease=pred,
-        probability=prob,
-        matched_symptoms=matched
-    )
+    prediction, _ = await run_prediction(payload, user)
+    return json_response(prediction)
+
+
+@app.post("/next_question")
+def next_question(payload: NextQuestionIn):
+    """Symptoms worth asking about next (by expected information gain) and the likeliest diseases"""
+    if question_engine is None:
+        raise HTTPException(status_code=503, detail="Next-question suggestions are not available")
+
+    names = [symptom_phrase(s) for s in payload.symptoms + payload.absent]
+    unknown = [s for s, name in zip(payload.symptoms + payload.absent, names) if name not in SYMPTOM_POSITION]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown symptoms: {', '.join(unknown[:10])}")
+
+    present = sorted({SYMPTOM_POSITION[n] for n in names[:len(payload.symptoms)]})
+    absent = sorted({SYMPTOM_POSITION[n] for n in names[len(payload.symptoms):]} - set(present))
+    return json_response(question_engine.suggest(present, absent, payload.top))
+
+
+@app.get("/models")
+def get_models():
+    """Registered models, which are loaded, and their hit counts and latency."""
+    return json_response(model_router.stats())
+
+
+@app.get("/metrics/admission")
+def get_admission_metrics():
+    """Inference slots in use, queue depth and shed request counts by priority."""
+    return json_response(admission.stats())
 
 
 
 @app.get("/get_details")
-def get_details(disease: str = Query(..., min_length=1, max_length=200)):
+def get_details(
+    disease: str = Query(..., min_length=1, max_length=200),
+    if_none_match: Optional[str] = Header(None),
+):
 
     # Validate input
     if not disease or not disease.strip():
@@ -365,54 +632,60 @@ def get_details(disease: str = Query(..., min_length=1, max_length=200)):
     if len(sanitized) != len(disease.strip()):
         raise HTTPException(status_code=400, detail="Invalid characters in disease name")
 
-    # Normalize all column names
-    df = details_df.rename(columns=lambda x: x.strip().lower())
-
     # ensure disease column exists
-    if "disease" not in df.columns:
-        return {"error": "CSV missing 'Disease' column", "columns": list(df.columns)}
-
-    # match disease
-    row = df[df["disease"].str.strip().str.lower() == sanitized.lower()]
-
-    if row.empty:
-        return DiseaseDetailsOut(
-            disease=disease,
-            description="No description found",
-            precautions=[]
-        )
-
-    item = row.iloc[0]
-
-    # extract precautions safely
-    precautions = [
-        str(item.get("precaution_1", "")),
-        str(item.get("precaution_2", "")),
-        str(item.get("precaution_3", "")),
-        str(item.get("precaution_4", "")),
-    ]
-    # Filter out empty precautions
-    precautions = [p for p in precautions if p and p.strip()]
-
-    return DiseaseDetailsOut(
-        disease=disease,
-        description=str(item.get("description", "No description found")),
-        precautions=precautions
-    )
+    if DETAILS_INDEX is None:
+        return {"error": "CSV missing 'Disease' column",
+                "columns": [c.strip().lower() for c in details_df.columns]}
+
+    if etag_matches(if_none_match, DETAILS_ETAG):
+        return not_modified(DETAILS_ETAG, DETAILS_CACHE_CONTROL)
+
+    return json_response(disease_details(disease, sanitized),
+                         headers=cache_headers(DETAILS_ETAG, DETAILS_CACHE_CONTROL))
+
+@app.get("/symptoms/suggest")
+def suggest_symptoms(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """Symptoms with a word starting with prefix, most severe and most common first"""
+    return json_response({
+        "prefix": prefix,
+        "suggestions": symptom_suggester.suggest(prefix, limit),
+    }, headers={"Cache-Control": DETAILS_CACHE_CONTROL})
+
+def disease_details(disease: str, key: Optional[str] = None) -> dict:
+    """Description and precautions for a disease (looked up by key, default the name)"""
+    description, precautions = ("No description found", [])
+    if DETAILS_INDEX is not None:
+        description, precautions = DETAILS_INDEX.get((key or disease).strip().lower(), (description, precautions))
+    return {"disease": disease, "description": description, "precautions": precautions}
 
 # -----------------------------------------------------
 # CHAT HISTORY ENDPOINTS
 # -----------------------------------------------------
 
 @app.get("/chats", response_model=List[ChatOut])
-async def get_chats(authorization: Optional[str] = Header(None)):
+async def get_chats(authorization: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
     """Get all chats for the current user"""
     user = await get_current_user(authorization)
     user_id = user["id"]
-    
-    query = chats.select().where(chats.c.user_id == user_id).order_by(chats.c.created_at.desc())
+
+    # the list only changes when a chat is created or deleted; a one-row
+    # aggregate tells us that without reading the list itself
+    version_query = select(
+        func.count().label("n"),
+        func.max(chats.c.id).label("last_id"),
+        func.max(chats.c.created_at).label("last_created"),
+    ).where(chats.c.user_id == user_id)
+    version = await database.fetch_one(version_query)
+    etag = make_etag("chats", user_id, version["n"], version["last_id"], version["last_created"])
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, CHATS_CACHE_CONTROL)
+
+    query = select(*CHAT_COLUMNS).where(chats.c.user_id == user_id).order_by(chats.c.created_at.desc())
     result = await database.fetch_all(query)
-    return result
+    return json_response(rows_list(result, CHAT_FIELDS), headers=cache_headers(etag, CHATS_CACHE_CONTROL))
 
 @app.post("/chats", response_model=ChatOut, status_code=201)
 async def create_chat(payload: CreateChatIn, authorization: Optional[str] = Header(None)):
@@ -426,12 +699,10 @@ async def create_chat(payload: CreateChatIn, authorization: Optional[str] = Head
     query = chats.insert().values(
         user_id=user_id,
         title=title
-    ).returning(
-        chats.c.id, chats.c.user_id, chats.c.title, chats.c.created_at
-    )
+    ).returning(*CHAT_COLUMNS)
     
     result = await database.fetch_one(query)
-    return result
+    return json_response(row_dict(result, CHAT_FIELDS), status_code=201)
 
 @app.get("/chats/{chat_id}", response_model=ChatWithMessagesOut)
 async def get_chat_with_messages(chat_id: int, authorization: Optional[str] = Header(None)):
@@ -440,16 +711,19 @@ async def get_chat_with_messages(chat_id: int, authorization: Optional[str] = He
     user_id = user["id"]
     
     # Verify chat belongs to user
-    chat_query = chats.select().where(chats.c.id == chat_id).where(chats.c.user_id == user_id)
+    chat_query = select(*CHAT_COLUMNS).where(chats.c.id == chat_id).where(chats.c.user_id == user_id)
     chat = await database.fetch_one(chat_query)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
     # Get messages for this chat
-    messages_query = messages.select().where(messages.c.chat_id == chat_id).order_by(messages.c.created_at.asc())
+    messages_query = select(*MESSAGE_COLUMNS).where(messages.c.chat_id == chat_id).order_by(messages.c.created_at.asc())
     chat_messages = await database.fetch_all(messages_query)
     
-    return {"chat": dict(chat), "messages": [dict(m) for m in chat_messages]}
+    return json_response({
+        "chat": row_dict(chat, CHAT_FIELDS),
+        "messages": rows_list(chat_messages, MESSAGE_FIELDS),
+    })
 
 @app.delete("/chats/{chat_id}", status_code=204)
 async def delete_chat(chat_id: int, authorization: Optional[str] = Header(None)):
@@ -465,6 +739,7 @@ async def delete_chat(chat_id: int, authorization: Optional[str] = Header(None))
     
     # Delete the chat (messages will be cascade deleted due to FK)
     await database.execute(chats.delete().where(chats.c.id == chat_id))
+    chat_symptom_state.forget(chat_id)
     return None
 
 @app.post("/chats/{chat_id}/messages", response_model=MessageOut, status_code=201)
@@ -479,18 +754,140 @@ async def create_message(chat_id: int, payload: CreateMessageIn, authorization:
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
+    result = await insert_message(chat_id, user_id, payload.role, payload.content)
+    return json_response(result, status_code=201)
+
+async def insert_message(chat_id: int, user_id: Optional[int], role: str, content: str) -> dict:
     query = messages.insert().values(
         chat_id=chat_id,
         user_id=user_id,
-        role=payload.role,
-        content=payload.content
-    ).returning(
-        messages.c.id, messages.c.chat_id, messages.c.user_id, 
-        messages.c.role, messages.c.content, messages.c.created_at
-    )
-    
-    result = await database.fetch_one(query)
-    return result
+        role=role,
+        content=content
+    ).returning(*MESSAGE_COLUMNS)
+
+    return row_dict(await database.fetch_one(query), MESSAGE_FIELDS)
+
+@app.get("/messages/search")
+async def search_chat_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=10000),
+    authorization: Optional[str] = Header(None),
+):
+    """Search the current user's messages; ranked results with highlighted snippets"""
+    user = await get_current_user(authorization)
+    user_id = user["id"]
+
+    if not search_terms(q):
+        raise HTTPException(status_code=400, detail="Search query must contain words")
+
+    # one extra row tells us whether there is a next page without counting every match
+    rows = await search_messages(database, user_id, q, limit + 1, offset)
+    return json_response({
+        "query": q,
+        "results": rows_list(rows[:limit], SEARCH_FIELDS),
+        "limit": limit,
+        "offset": offset,
+        "has_more": len(rows) > limit,
+    })
+
+# -----------------------------------------------------
+# CHAT WEBSOCKET - one authenticated connection per session
+# -----------------------------------------------------
+# seconds a new connection has to send its auth message
+WS_AUTH_TIMEOUT = float(os.environ.get("WS_AUTH_TIMEOUT", 10))
+WS_CLOSE_UNAUTHORIZED = 4401
+
+
+async def chat_turn(user, message: dict) -> dict:
+    """Predict for one chat message, persist both sides of the turn and look up details"""
+    if message.get("type", "predict") != "predict":
+        raise HTTPException(status_code=400, detail="Unknown message type")
+    payload = PredictionIn.model_validate(message)
+
+    prediction, chat = await run_prediction(payload, user, new_chat_title=chat_title(payload.user_input))
+    chat_id = chat["id"] if chat else payload.chat_id
+
+    user_message = await insert_message(chat_id, user["id"], "user", payload.user_input)
+    assistant_message = await insert_message(chat_id, user["id"], "assistant", dumps(prediction).decode())
+
+    return {
+        "chat_id": chat_id,
+        "chat": chat,
+        "prediction": prediction,
+        "details": disease_details(prediction["predicted_disease"]),
+        "message_ids": {"user": user_message["id"], "assistant": assistant_message["id"]},
+    }
+
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    """Chat over one connection instead of several authenticated HTTP requests per turn.
+
+    Client sends {"type": "auth", "token": ...} first, then per turn
+    {"type": "predict", "id": <any>, "user_input": ..., "chat_id": <optional>,
+    "explain": <optional>, "model": <optional>}; leaving out chat_id starts a new chat.
+    Server answers {"type": "ready", "user_id"}, then per turn
+    {"type": "prediction", "id", "chat_id", "chat", "prediction", "details", "message_ids"}
+    or {"type": "error", "id", "status", "detail"}. The connection is closed
+    with WS_CLOSE_UNAUTHORIZED at the first turn after the token expires.
+    """
+    await websocket.accept()
+
+    async def send(message):
+        await websocket.send_text(dumps(message).decode())
+
+    try:
+        try:
+            auth = await asyncio.wait_for(websocket.receive_json(), WS_AUTH_TIMEOUT)
+            if auth.get("type") != "auth":
+                raise HTTPException(status_code=401, detail="Expected auth message")
+            token = str(auth.get("token") or "")
+            user = await user_from_token(token)
+            expires_at = decode_access_token(token).get("exp")
+        except (asyncio.TimeoutError, HTTPException, ValueError, KeyError, AttributeError):
+            await websocket.close(code=WS_CLOSE_UNAUTHORIZED)
+            return
+
+        user_id = user["id"]
+        await send({"type": "ready", "user_id": user_id})
+
+        while True:
+            try:
+                message = await websocket.receive_json()
+                if not isinstance(message, dict):
+                    raise ValueError
+            except (ValueError, KeyError):
+                await send({"type": "error", "id": None, "status": 400, "detail": "Expected a JSON object"})
+                continue
+            ref = message.get("id")
+
+            # the token was only checked at connect; don't act on it past its expiry
+            if expires_at is not None and time.time() >= expires_at:
+                await websocket.close(code=WS_CLOSE_UNAUTHORIZED, reason="Token expired")
+                return
+
+            # same per-user budget the HTTP rate limit uses
+            retry_after = rate_limiter.allow("user:" + str(user_id)) if rate_limiter.enabled else 0
+            if retry_after:
+                await send({"type": "error", "id": ref, "status": 429, "detail": "Too many requests",
+                            "retry_after": max(1, round(retry_after))})
+                continue
+
+            try:
+                reply = await chat_turn(user, message)
+            except HTTPException as e:
+                error = {"type": "error", "id": ref, "status": e.status_code, "detail": e.detail}
+                if e.headers and "Retry-After" in e.headers:
+                    error["retry_after"] = int(e.headers["Retry-After"])
+                await send(error)
+            except ValidationError as e:
+                await send({"type": "error", "id": ref, "status": 422,
+                            "detail": e.errors(include_url=False, include_context=False)})
+            else:
+                await send({"type": "prediction", "id": ref, **reply})
+    except WebSocketDisconnect:
+        return
 
 # -----------------------------------------------------
 # USER PROFILE ENDPOINTS
@@ -500,15 +897,28 @@ async def create_message(chat_id: int, payload: CreateMessageIn, authorization:
 async def get_user_profile(authorization: Optional[str] = Header(None)):
     """Get current user's profile"""
     user = await get_current_user(authorization)
-    return {
-        "id": user["id"],
-        "full_name": user["full_name"],
-        "email": user["email"],
-        "dob": user["dob"],
-        "gender": user["gender"],
-        "nationality": user["nationality"],
-        "created_at": user["created_at"]
-    }
+    return json_response(row_dict(user, USER_FIELDS))
+
+@app.get("/user/export")
+async def export_user_data(
+    compress: bool = Query(False, description="gzip the NDJSON on the fly"),
+    authorization: Optional[str] = Header(None),
+):
+    """Stream the current user's profile, chats and messages as NDJSON"""
+    user = await get_current_user(authorization)
+
+    stream = export_lines(database, row_dict(user, USER_FIELDS))
+    filename = f"export-user-{user['id']}.ndjson"
+    media_type = "application/x-ndjson"
+    if compress:
+        stream = gzip_stream(stream)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(stream, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "no-store",
+    })
 
 @app.put("/user/profile", response_model=UserOut)
 async def update_user_profile(
@@ -533,13 +943,10 @@ async def update_user_profile(
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
     
-    query = users.update().where(users.c.id == user_id).values(**update_data).returning(
-        users.c.id, users.c.full_name, users.c.email, users.c.dob,
-        users.c.gender, users.c.nationality, users.c.created_at
-    )
+    query = users.update().where(users.c.id == user_id).values(**update_data).returning(*USER_COLUMNS)
     
     result = await database.fetch_one(query)
-    return result
+    return json_response(row_dict(result, USER_FIELDS))
 
 @app.post("/user/change-password", status_code=200)
 async def change_password(
@@ -0,0 +1,287 @@
+# model_artifact.py
+"""Compact binary format for tree-ensemble models.
+
+Layout::
+
+    MAGIC (8 bytes) | header length (uint32 LE) | JSON header | padding | arrays
+
+The JSON header carries the format version, schema, feature names, class
+labels, array table (dtype/shape/offset) and a SHA-256 of the array payload.
+Arrays are stored flat and 64-byte aligned so the loader can map them
+straight out of the file with ``np.frombuffer`` without copying.
+
+Only numpy is needed to load and run a model; scikit-learn is only touched
+when converting a fitted estimator (``ForestModel.from_sklearn``) or when
+falling back to a legacy pickle in ``load_model``.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from functools import cached_property
+from typing import Dict, List, Optional
+
+import numpy as np
+
+MAGIC = b"DPMODEL\x00"
+FORMAT_VERSION = 1
+SCHEMA = "tree_ensemble"
+ALIGN = 64
+
+_PREFIX = struct.Struct("<8sI")
+
+
+class ArtifactError(ValueError):
+    pass
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class ForestModel:
+    """Tree ensemble stored as flat node arrays; mirrors RandomForestClassifier.predict_proba.
+
+    Trees are concatenated: node ids are global, ``roots`` holds the root of
+    each tree, ``left``/``right`` are -1 on leaves and ``value`` holds the
+    class distribution (fractions) at every node.
+    """
+
+    ARRAYS = ("roots", "left", "right", "feature", "threshold", "value")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], classes: List[str],
+                 feature_names: List[str], max_depth: int,
+                 metadata: Optional[dict] = None, checksum: Optional[str] = None,
+                 buffer=None):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.classes_ = np.array(classes, dtype=object)
+        self.feature_names_in_ = np.array(feature_names, dtype=object)
+        self.n_features_in_ = len(feature_names)
+        self.max_depth = max_depth
+        self.metadata = metadata or {}
+        self.checksum = checksum
+        # keeps the mmap alive for the zero-copy arrays above
+        self._buffer = buffer
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+    @classmethod
+    def from_sklearn(cls, model, feature_names=None, metadata=None) -> "ForestModel":
+        """Convert a fitted RandomForestClassifier / DecisionTreeClassifier."""
+        estimators = getattr(model, "estimators_", None) or [model]
+        if feature_names is None:
+            feature_names = getattr(model, "feature_names_in_", None)
+            if feature_names is None:
+                feature_names = [f"x{i}" for i in range(model.n_features_in_)]
+
+        roots, left, right, feature, threshold, value = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for est in estimators:
+            t = est.tree_
+            is_leaf = t.children_left < 0
+            roots.append(offset)
+            left.append(np.where(is_leaf, -1, t.children_left + offset))
+            right.append(np.where(is_leaf, -1, t.children_right + offset))
+            feature.append(np.where(is_leaf, 0, t.feature))
+            threshold.append(np.where(is_leaf, 0.0, t.threshold))
+            counts = t.value[:, 0, :]
+            value.append(counts / counts.sum(axis=1, keepdims=True))
+            offset += t.node_count
+            max_depth = max(max_depth, t.max_depth)
+
+        arrays = {
+            "roots": np.array(roots, dtype=np.int32),
+            "left": np.concatenate(left).astype(np.int32),
+            "right": np.concatenate(right).astype(np.int32),
+            "feature": np.concatenate(feature).astype(np.int32),
+            "threshold": np.concatenate(threshold).astype(np.float64),
+            "value": np.concatenate(value).astype(np.float32),
+        }
+        return cls(arrays, [str(c) for c in model.classes_], [str(f) for f in feature_names],
+                   int(max_depth), metadata)
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node id per (sample, tree)."""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        n, n_trees = X.shape[0], len(self.roots)
+        # flat (sample, tree) walkers; only those still on internal nodes move
+        nodes = np.tile(self.roots, n)
+        rows = np.repeat(np.arange(n), n_trees)
+        active = np.arange(n * n_trees)
+        while active.size:
+            cur = nodes[active]
+            left = self.left[cur]
+            internal = left >= 0
+            active, cur, left = active[internal], cur[internal], left[internal]
+            go_left = X[rows[active], self.feature[cur]] <= self.threshold[cur]
+            nodes[active] = np.where(go_left, left, self.right[cur])
+        return nodes.reshape(n, n_trees)
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.value[self.apply(X)].mean(axis=1, dtype=np.float64)
+
+    @cached_property
+    def node_deltas(self) -> np.ndarray:
+        """value[node] - value[parent] for every node (0 at the roots)."""
+        parent = np.full(len(self.left), -1, dtype=np.int64)
+        internal = np.flatnonzero(self.left >= 0)
+        parent[self.left[internal]] = internal
+        parent[self.right[internal]] = internal
+        deltas = self.value - self.value[np.maximum(parent, 0)]
+        deltas[parent < 0] = 0
+        return deltas
+
+    def explain(self, X):
+        """predict_proba plus per-feature contributions from the decision paths.
+
+        Every step from a node to its child moves the class distribution by
+        node_deltas[child]; that move is credited to the feature the node
+        split on. Averaged over trees, the result satisfies
+        ``proba == bias + contributions.sum(axis=1)`` where bias is the mean
+        root distribution. Returns (proba (n, classes), contributions
+        (n, features, classes)).
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        n, n_trees, n_features = X.shape[0], len(self.roots), self.n_features_in_
+        nodes = np.tile(self.roots, n)
+        rows = np.repeat(np.arange(n), n_trees)
+        active = np.arange(n * n_trees)
+        # (sample, split feature) key and child node of every step taken
+        keys, children = [], []
+        while active.size:
+            cur = nodes[active]
+            left = self.left[cur]
+            internal = left >= 0
+            active, cur, left = active[internal], cur[internal], left[internal]
+            split = self.feature[cur]
+            child = np.where(X[rows[active], split] <= self.threshold[cur], left, self.right[cur])
+            keys.append(rows[active] * n_features + split)
+            children.append(child)
+            nodes[active] = child
+
+        n_classes = self.value.shape[1]
+        contributions = np.zeros((n * n_features, n_classes))
+        if keys:
+            keys, children = np.concatenate(keys), np.concatenate(children)
+            order = np.argsort(keys, kind="stable")
+            keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            sums = np.add.reduceat(self.node_deltas[children[order]], starts, axis=0, dtype=np.float64)
+            contributions[keys[starts]] = sums / n_trees
+
+        proba = self.value[nodes.reshape(n, n_trees)].mean(axis=1, dtype=np.float64)
+        return proba, contributions.reshape(n, n_features, n_classes)
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def save(self, path: str):
+        """Write the model in the artifact format."""
+        table, offset = {}, 0
+        for name in self.ARRAYS:
+            arr = np.ascontiguousarray(getattr(self, name))
+            table[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+            offset = _align(offset + arr.nbytes)
+
+        payload = bytearray(offset)
+        for name in self.ARRAYS:
+            arr = np.ascontiguousarray(getattr(self, name))
+            start = table[name]["offset"]
+            payload[start:start + arr.nbytes] = arr.tobytes()
+
+        header = json.dumps({
+            "format_version": FORMAT_VERSION,
+            "schema": SCHEMA,
+            "features": [str(f) for f in self.feature_names_in_],
+            "classes": [str(c) for c in self.classes_],
+            "max_depth": self.max_depth,
+            "arrays": table,
+            "checksum": "sha256:" + hashlib.sha256(payload).hexdigest(),
+            "metadata": self.metadata,
+        }).encode("utf-8")
+
+        payload_start = _align(_PREFIX.size + len(header))
+        with open(path, "wb") as f:
+            f.write(_PREFIX.pack(MAGIC, len(header)))
+            f.write(header)
+            f.write(b"\0" * (payload_start - _PREFIX.size - len(header)))
+            f.write(payload)
+
+
+def is_artifact(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load_artifact(path: str, verify: bool = True) -> ForestModel:
+    """Map an artifact file and wrap its arrays without copying."""
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(buf) < _PREFIX.size:
+        raise ArtifactError(f"Not a model artifact: {path}")
+    magic, header_len = _PREFIX.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ArtifactError(f"Not a model artifact: {path}")
+
+    header = json.loads(bytes(buf[_PREFIX.size:_PREFIX.size + header_len]))
+    if header.get("format_version") != FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported artifact version {header.get('format_version')}: {path}")
+    if header.get("schema") != SCHEMA:
+        raise ArtifactError(f"Unsupported artifact schema {header.get('schema')!r}: {path}")
+
+    payload_start = _align(_PREFIX.size + header_len)
+    if verify:
+        digest = "sha256:" + hashlib.sha256(memoryview(buf)[payload_start:]).hexdigest()
+        if digest != header["checksum"]:
+            raise ArtifactError(f"Artifact checksum mismatch: {path}")
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        arrays[name] = np.frombuffer(buf, dtype=dtype, count=count,
+                                     offset=payload_start + spec["offset"]).reshape(spec["shape"])
+
+    return ForestModel(arrays, header["classes"], header["features"], header["max_depth"],
+                       header.get("metadata"), header["checksum"], buffer=buf)
+
+
+def load_model(path: str, feature_names: Optional[List[str]] = None):
+    """Load an artifact, or a legacy pickle (needs scikit-learn) converted to ForestModel when possible.
+
+    feature_names names the columns of a pickled estimator fitted without
+    them (no feature_names_in_), e.g. the symptom_list.pkl order.
+    """
+    if is_artifact(path):
+        return load_artifact(path)
+
+    import pickle
+
+    with open(path, "rb") as f:
+        model = pickle.load(f)
+    if hasattr(model, "estimators_") or hasattr(model, "tree_"):
+        names = getattr(model, "feature_names_in_", None)
+        if names is None and feature_names is not None:
+            if len(feature_names) != model.n_features_in_:
+                raise ArtifactError(f"{path}: model has {model.n_features_in_} features, "
+                                    f"got {len(feature_names)} names")
+            names = list(feature_names)
+        return ForestModel.from_sklearn(model, names)
+    return model
+
+
+def save_model_artifact(model, path: str, feature_names=None, metadata=None) -> ForestModel:
+    """Convert a fitted sklearn tree model and write it to path."""
+    forest = ForestModel.from_sklearn(model, feature_names, metadata)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    forest.save(path)
+    return forest
@@ -0,0 +1,248 @@
+# model_router.py
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .model_artifact import load_model
+from .symptom_vocab import symptom_phrase
+
+
+class UnknownModel(KeyError):
+    pass
+
+
+class ModelStats:
+    """Per-model counters; kept by the router so they survive evictions."""
+
+    def __init__(self):
+        self.requests = 0
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+        self.predictions = 0
+        self.predict_seconds = 0.0
+        self.recent = deque(maxlen=1000)
+
+    def record(self, seconds: float):
+        self.predictions += 1
+        self.predict_seconds += seconds
+        self.recent.append(seconds)
+
+    def as_dict(self) -> dict:
+        recent = np.array(self.recent) * 1000
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "load_ms": round(self.load_seconds * 1000, 3),
+            "predictions": self.predictions,
+            "mean_ms": round(self.predict_seconds / self.predictions * 1000, 3) if self.predictions else None,
+            "p50_ms": round(float(np.percentile(recent, 50)), 3) if recent.size else None,
+            "p99_ms": round(float(np.percentile(recent, 99)), 3) if recent.size else None,
+        }
+
+
+class ServedModel:
+    """A loaded model plus the mapping from the app's symptom list to its features.
+
+    Predictions are memoized per (symptom set, explain) and timed.
+    """
+
+    def __init__(self, name: str, model, symptoms: List[str], cache_size: int = 4096,
+                 stats: Optional[ModelStats] = None):
+        self.name = name
+        self.model = model
+        self.stats = stats or ModelStats()
+        self.n_symptoms = len(symptoms)
+
+        # model feature -> position in symptoms (-1 if the app never matches it); names
+        # are compared as phrases, so 'spotting_ urination' and 'spotting_urination' agree
+        self.feature_index = None
+        self.feature_symptoms = list(symptoms)
+        if hasattr(model, "feature_names_in_"):
+            pos = {symptom_phrase(s): i for i, s in enumerate(symptoms)}
+            names = [str(s) for s in model.feature_names_in_]
+            self.feature_index = np.array([pos.get(symptom_phrase(n), -1) for n in names])
+            self.feature_symptoms = [symptoms[i] if i >= 0 else n.lower().strip()
+                                     for i, n in zip(self.feature_index, names)]
+
+        # resident size for the router's budget; the per-node value deltas behind
+        # explanations are computed here, once at load, rather than per request
+        self.nbytes = getattr(model, "nbytes", 0)
+        if hasattr(model, "node_deltas"):
+            self.nbytes += model.node_deltas.nbytes
+
+        self._predict = lru_cache(maxsize=cache_size)(self._predict_uncached)
+
+    def vector(self, idx) -> np.ndarray:
+        """Model input row for the given positions in the symptom list."""
+        vec = np.zeros(self.n_symptoms, dtype=np.int64)
+        vec[list(idx)] = 1
+        if self.feature_index is not None:
+            vec = np.where(self.feature_index >= 0, vec[self.feature_index], 0)
+        return vec.reshape(1, -1)
+
+    def predict(self, idx, explain: bool = False):
+        """(disease, probability, contributions) for a set of symptom positions.
+
+        contributions maps each present symptom to its share of the predicted
+        class probability (decision-path attribution); None unless explain=True
+        and the model supports it.
+        """
+        start = time.perf_counter()
+        result = self._predict(tuple(sorted(set(idx))), bool(explain))
+        self.stats.record(time.perf_counter() - start)
+        return result
+
+    def _predict_uncached(self, idx: tuple, explain: bool):
+        model = self.model
+        arr = self.vector(idx)
+        contributions = None
+
+        if explain and hasattr(model, "explain"):
+            probs, contrib = model.explain(arr)
+            best = int(np.argmax(probs[0]))
+            present = np.flatnonzero(arr[0])
+            ranked = sorted(present, key=lambda i: contrib[0, i, best], reverse=True)
+            contributions = {self.feature_symptoms[i]: round(float(contrib[0, i, best]), 4) for i in ranked}
+            pred, prob = model.classes_[best], float(probs[0][best])
+        elif hasattr(model, "predict_proba"):
+            probs = model.predict_proba(arr)
+            best = np.argmax(probs)
+            pred = model.classes_[best]
+            prob = float(probs[0][best])
+        else:
+            pred = model.predict(arr)[0]
+            prob = None
+
+        return str(pred), prob, contributions
+
+
+class ModelRouter:
+    """Maps requests to named models, loading them on first use.
+
+    Loaded models sit in an LRU bounded by max_bytes (sum of their array
+    sizes; 0 = no limit). The default model is pinned and never evicted, and
+    a model is always kept while it's the only one that fits. Cohort routes
+    (e.g. nationality -> model name) are matched case-insensitively; anything
+    unrouted goes to the default.
+    """
+
+    def __init__(self, symptoms: List[str], default: str, paths: Dict[str, str],
+                 routes: Optional[Dict[str, str]] = None, max_bytes: int = 0,
+                 cache_size: int = 4096, loader=load_model):
+        if default not in paths:
+            raise ValueError(f"Default model {default!r} is not registered")
+        for cohort, name in (routes or {}).items():
+            if name not in paths:
+                raise ValueError(f"Route {cohort!r} points at unknown model {name!r}")
+        self.symptoms = symptoms
+        self.default = default
+        self.paths = dict(paths)
+        self.routes = {k.lower().strip(): v for k, v in (routes or {}).items()}
+        self.max_bytes = max_bytes
+        self.cache_size = cache_size
+        self.loader = loader
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+        # per-model, so a cold load blocks only requests for that model
+        self._load_locks = {name: threading.Lock() for name in self.paths}
+        self._stats = {name: ModelStats() for name in self.paths}
+
+    def resolve(self, name: Optional[str] = None, cohort: Optional[str] = None) -> str:
+        """Model name for a request: an explicit name, else the cohort's route, else the default."""
+        if name:
+            if name not in self.paths:
+                raise UnknownModel(name)
+            return name
+        if cohort:
+            return self.routes.get(cohort.lower().strip(), self.default)
+        return self.default
+
+    def add(self, name: str, model, path: Optional[str] = None) -> ServedModel:
+        """Register an already loaded model (used for the default, loaded at startup)."""
+        with self._lock:
+            if path:
+                self.paths[name] = path
+            self._load_locks.setdefault(name, threading.Lock())
+            stats = self._stats.setdefault(name, ModelStats())
+            served = ServedModel(name, model, self.symptoms, self.cache_size, stats)
+            stats.loads += 1
+            self._resident[name] = served
+            self._evict()
+        return served
+
+    def _hit(self, name: str) -> Optional[ServedModel]:
+        served = self._resident.get(name)
+        if served is not None:
+            self._stats[name].hits += 1
+            self._resident.move_to_end(name)
+        return served
+
+    def get(self, name: Optional[str] = None) -> ServedModel:
+        """The named model, loading it if needed (blocking: call from a worker thread)."""
+        name = name or self.default
+        if name not in self.paths:
+            raise UnknownModel(name)
+        with self._lock:
+            stats = self._stats[name]
+            stats.requests += 1
+            served = self._hit(name)
+        if served is not None:
+            return served
+
+        with self._load_locks[name]:
+            # another request may have loaded it while this one waited
+            with self._lock:
+                served = self._hit(name)
+            if served is not None:
+                return served
+
+            start = time.perf_counter()
+            served = ServedModel(name, self.loader(self.paths[name]), self.symptoms, self.cache_size, stats)
+            with self._lock:
+                stats.loads += 1
+                stats.load_seconds += time.perf_counter() - start
+                self._resident[name] = served
+                self._evict()
+            return served
+
+    def _evict(self):
+        if self.max_bytes <= 0:
+            return
+        for name in list(self._resident):
+            if self.resident_bytes() <= self.max_bytes or len(self._resident) <= 1:
+                return
+            if name == self.default or name == next(reversed(self._resident)):
+                continue
+            del self._resident[name]
+            self._stats[name].evictions += 1
+
+    def resident_bytes(self) -> int:
+        return sum(m.nbytes for m in self._resident.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = {}
+            for name, path in self.paths.items():
+                served = self._resident.get(name)
+                models[name] = {
+                    "path": os.path.basename(path),
+                    "resident": served is not None,
+                    "nbytes": served.nbytes if served else None,
+                    **self._stats[name].as_dict(),
+                }
+            return {
+                "default": self.default,
+                "routes": dict(self.routes),
+                "max_bytes": self.max_bytes,
+                "resident_bytes": self.resident_bytes(),
+                "models": models,
+            }
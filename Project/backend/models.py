@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Table, Column, Integer, String, Date, TIMESTAMP, func, Text, ForeignKey, Text
+from sqlalchemy import Table, Column, Integer, String, Date, TIMESTAMP, func, Text, ForeignKey, Text, LargeBinary, DDL, event
 from .db import metadata
 
 users = Table(
@@ -24,8 +24,19 @@ chats = Table(
     Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
     Column("title", Text, nullable=True),
     Column("created_at", TIMESTAMP(timezone=True), server_default=func.now()),
+    # bitset of symptoms matched so far in this chat (see chat_state.py)
+    Column("symptom_state", LargeBinary, nullable=True),
 )
 
+# create_all() skips existing tables, so add columns introduced later here
+event.listen(
+    metadata,
+    "after_create",
+    DDL("ALTER TABLE chats ADD COLUMN IF NOT EXISTS symptom_state BYTEA").execute_if(dialect="postgresql"),
+)
+# per-user lookups (chat list and its ETag aggregate, export, search)
+event.listen(metadata, "after_create", DDL("CREATE INDEX IF NOT EXISTS chats_user_id_idx ON chats (user_id)"))
+
 messages = Table(
     "messages",
     metadata,
@@ -36,3 +47,28 @@ messages = Table(
     Column("content", Text, nullable=False),
     Column("created_at", TIMESTAMP(timezone=True), server_default=func.now()),
 )
+
+# Full-text search over messages.content (see search.py).
+# Postgres: generated tsvector column + GIN index, so searches never rescan content.
+for _statement in (
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', content)) STORED",
+    "CREATE INDEX IF NOT EXISTS messages_search_vector_idx ON messages USING GIN (search_vector)",
+):
+    event.listen(metadata, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+# SQLite (local testing): external-content FTS5 table kept in sync by triggers.
+# The rebuild indexes rows written before the table existed; it's a full pass, fine for dev databases.
+for _statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "content, content='messages', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')",
+):
+    event.listen(metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
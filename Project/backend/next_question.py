@@ -0,0 +1,120 @@
+# next_question.py
+import os
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .symptom_vocab import symptom_phrase
+
+
+def _xlogx(a: np.ndarray) -> np.ndarray:
+    return a * np.log(np.where(a > 0, a, 1.0))
+
+
+class QuestionEngine:
+    """Picks the symptom worth asking about next, by expected information gain.
+
+    Built once from a training table: P(symptom | disease) with add-alpha
+    smoothing and the disease prior. For a set of present (and optionally
+    ruled-out) symptoms the naive-Bayes posterior over diseases is computed,
+    then for every symptom not asked yet
+
+        gain = H(D) - [P(yes) H(D | yes) + P(no) H(D | no)]
+
+    in one (diseases x symptoms) NumPy pass. Gains are in bits. Symptom
+    indices refer to the symptom list the engine was built with; symptoms
+    the table doesn't cover are never suggested.
+    """
+
+    def __init__(self, symptoms: List[str], diseases: List[str], counts: np.ndarray,
+                 totals: np.ndarray, known: Optional[np.ndarray] = None, alpha: float = 1.0):
+        self.symptoms = list(symptoms)
+        self.labels = [symptom_phrase(s) for s in self.symptoms]
+        self.diseases = np.array(diseases, dtype=object)
+        self.theta = (counts + alpha) / (totals[:, None] + 2 * alpha)
+        self.log_theta = np.log(self.theta)
+        self.log_not_theta = np.log1p(-self.theta)
+        self.theta_log_theta = self.theta * self.log_theta
+        self.not_theta_log_not_theta = (1 - self.theta) * self.log_not_theta
+        self.log_prior = np.log(totals / totals.sum())
+        # symptoms with no column in the table
+        self.unknown = np.zeros(len(self.symptoms), dtype=bool) if known is None else ~known
+
+    @classmethod
+    def from_csv(cls, symptoms: List[str], path: str, label_column: str = "prognosis",
+                 alpha: float = 1.0) -> "QuestionEngine":
+        df = pd.read_csv(path)
+        df.columns = [str(c).strip() for c in df.columns]
+        labels = df[label_column].astype(str).str.strip()
+        columns = {symptom_phrase(c): c for c in df.columns if c != label_column}
+
+        grouped = df.groupby(labels)
+        diseases = list(grouped.groups)
+        totals = grouped.size().reindex(diseases).to_numpy(dtype=np.float64)
+        counts = np.zeros((len(diseases), len(symptoms)))
+        known = np.zeros(len(symptoms), dtype=bool)
+        for j, s in enumerate(symptoms):
+            column = columns.get(symptom_phrase(s))
+            if column is None:
+                continue
+            known[j] = True
+            flags = pd.to_numeric(df[column], errors="coerce").fillna(0).gt(0)
+            counts[:, j] = flags.groupby(labels).sum().reindex(diseases).to_numpy()
+
+        return cls(symptoms, diseases, counts, totals, known, alpha)
+
+    def posterior(self, present: Iterable[int] = (), absent: Iterable[int] = ()) -> np.ndarray:
+        present, absent = list(present), list(absent)
+        log_post = (self.log_prior
+                    + self.log_theta[:, present].sum(axis=1)
+                    + self.log_not_theta[:, absent].sum(axis=1))
+        post = np.exp(log_post - log_post.max())
+        return post / post.sum()
+
+    def information_gain(self, post: np.ndarray) -> np.ndarray:
+        """Expected entropy reduction (bits) from asking about each symptom.
+
+        With joint masses yes = post * theta and no = post * (1 - theta),
+        sum(yes log yes) = plogp @ theta + post @ (theta log theta) (and the
+        same for no), so the whole table is a few matrix-vector products.
+        """
+        plogp = _xlogx(post)
+        p_yes = post @ self.theta
+        sum_yes = plogp @ self.theta + post @ self.theta_log_theta
+        sum_no = plogp.sum() - plogp @ self.theta + post @ self.not_theta_log_not_theta
+        expected = _xlogx(p_yes) - sum_yes + _xlogx(1 - p_yes) - sum_no
+        entropy = -plogp.sum()
+        return (entropy - expected) / np.log(2)
+
+    def suggest(self, present: Iterable[int] = (), absent: Iterable[int] = (), top: int = 1) -> dict:
+        """Best symptoms to ask about next plus the current most likely diseases."""
+        present, absent = list(present), list(absent)
+        post = self.posterior(present, absent)
+        gain = self.information_gain(post)
+        gain[present + absent] = -np.inf
+        gain[self.unknown] = -np.inf
+
+        top = min(top, int(np.isfinite(gain).sum()))
+        best = np.argpartition(-gain, top - 1)[:top] if top > 0 else np.array([], dtype=int)
+        best = best[np.argsort(-gain[best], kind="stable")]
+        p_yes = self.theta[:, best].T @ post
+
+        likely = np.argsort(-post)[:3]
+        return {
+            "questions": [{
+                "symptom": self.symptoms[j],
+                "label": self.labels[j],
+                "information_gain": round(float(gain[j]), 4),
+                "p_yes": round(float(p), 4),
+            } for j, p in zip(best, p_yes)],
+            "likely_diseases": [{"disease": str(self.diseases[d]), "probability": round(float(post[d]), 4)}
+                                for d in likely],
+        }
+
+
+def build_question_engine(symptoms: List[str], training_path: str) -> Optional[QuestionEngine]:
+    """QuestionEngine from a training CSV, or None if the file isn't there."""
+    if not os.path.exists(training_path):
+        return None
+    return QuestionEngine.from_csv(symptoms, training_path)
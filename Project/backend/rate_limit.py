@@ -0,0 +1,190 @@
+# rate_limit.py
+import json
+import threading
+import time
+from typing import Optional
+
+from .auth_utils import decode_access_token
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets keyed by client id, split over locked shards.
+
+    Each bucket is a ``[tokens, last_seen]`` pair refilled lazily on access, so
+    a check is O(1). A bucket left alone for ``capacity / rate`` seconds is
+    full again, which makes it indistinguishable from a fresh one; those are
+    swept one shard at a time every ``sweep_interval`` seconds.
+    """
+
+    def __init__(self, rate_per_minute: int, burst: Optional[int] = None,
+                 shards: int = 16, sweep_interval: float = 30.0):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or rate_per_minute)
+        self.idle_ttl = self.capacity / self.rate if self.rate else 0.0
+        self.sweep_interval = sweep_interval
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self._next_sweep = None
+        self._sweep_cursor = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def allow(self, key: str, now: Optional[float] = None) -> float:
+        """Take one token for key. Returns 0 if allowed, else seconds to wait."""
+        if not self.enabled:
+            return 0.0
+        if now is None:
+            now = time.monotonic()
+        buckets, lock = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [self.capacity, now]
+            else:
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                retry_after = 0.0
+            else:
+                retry_after = (1.0 - bucket[0]) / self.rate
+
+        if self._next_sweep is None:
+            self._next_sweep = now + self.sweep_interval
+        elif now >= self._next_sweep:
+            self._sweep(now)
+        return retry_after
+
+    def _sweep(self, now: float):
+        """Drop buckets that have been idle long enough to be full again."""
+        self._next_sweep = now + self.sweep_interval
+        buckets, lock = self._shards[self._sweep_cursor]
+        self._sweep_cursor = (self._sweep_cursor + 1) % len(self._shards)
+        with lock:
+            idle = [k for k, (_, seen) in buckets.items() if now - seen >= self.idle_ttl]
+            for k in idle:
+                del buckets[k]
+
+    def __len__(self):
+        return sum(len(buckets) for buckets, _ in self._shards)
+
+    def reset(self):
+        for buckets, lock in self._shards:
+            with lock:
+                buckets.clear()
+
+
+def _user_id_from_headers(headers) -> Optional[str]:
+    """Best-effort user id from a bearer token; no DB lookup."""
+    authorization = headers.get(b"authorization")
+    if not authorization:
+        return None
+    value = authorization.decode("latin-1")
+    if not value.lower().startswith("bearer "):
+        return None
+    try:
+        return decode_access_token(value.split(" ", 1)[1].strip()).get("sub")
+    except Exception:
+        return None
+
+
+async def _send_json_error(send, status: int, detail: str, headers=()):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """Reject requests with 429 once the client IP or user runs out of tokens."""
+
+    def __init__(self, app, limiter: TokenBucketLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or not self.limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        keys = ["ip:" + (client[0] if client else "unknown")]
+        user_id = _user_id_from_headers(dict(scope["headers"]))
+        if user_id:
+            keys.append("user:" + str(user_id))
+
+        for key in keys:
+            retry_after = self.limiter.allow(key)
+            if retry_after:
+                await _send_json_error(
+                    send, 429, "Too many requests",
+                    [(b"retry-after", str(max(1, round(retry_after))).encode())],
+                )
+                return
+
+        await self.app(scope, receive, send)
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies over max_body_size with 413.
+
+    A declared Content-Length is checked up front; chunked bodies are counted
+    as they stream in. Once the limit is crossed the 413 is sent straight
+    away and the app sees a client disconnect, so the rest is never read.
+    """
+
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_body_size <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                await _send_json_error(send, 400, "Invalid Content-Length header")
+                return
+            if declared > self.max_body_size:
+                await _send_json_error(send, 413, "Request body too large")
+                return
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    rejected = True
+                    if not response_started:
+                        await _send_json_error(send, 413, "Request body too large")
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
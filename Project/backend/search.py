@@ -0,0 +1,77 @@
+# search.py
+"""Ranked full-text search over a user's messages.
+
+Postgres uses the generated ``messages.search_vector`` column and its GIN
+index; SQLite uses the ``messages_fts`` FTS5 table (both created in
+models.py). Snippets mark matched terms with ``**``.
+
+Only the user's own messages are searched: assistant messages hold the
+prediction as JSON, which repeats the user's text.
+"""
+import re
+from typing import List
+
+from sqlalchemy import TIMESTAMP, Float, Integer, Text, column, text
+
+HIGHLIGHT = "**"
+
+# rank on the matching rows, then build headlines only for the page being returned
+_POSTGRES_SEARCH = text(f"""
+    SELECT m.id, m.chat_id, c.title AS chat_title, m.role, m.created_at, hits.rank,
+           ts_headline('english', m.content, websearch_to_tsquery('english', :query),
+                       'StartSel={HIGHLIGHT}, StopSel={HIGHLIGHT}, MaxWords=24, MinWords=8, MaxFragments=2') AS snippet
+    FROM (
+        SELECT m.id, ts_rank(m.search_vector, q) AS rank
+        FROM messages m
+        JOIN chats c ON c.id = m.chat_id,
+             websearch_to_tsquery('english', :query) q
+        WHERE c.user_id = :user_id AND m.role = 'user' AND m.search_vector @@ q
+        ORDER BY rank DESC, m.id DESC
+        LIMIT :limit OFFSET :offset
+    ) hits
+    JOIN messages m ON m.id = hits.id
+    JOIN chats c ON c.id = m.chat_id
+    ORDER BY hits.rank DESC, m.id DESC
+""")
+
+# bm25() is lower-is-better; negate so rank means the same on both backends
+_SQLITE_SEARCH = text(f"""
+    SELECT m.id, m.chat_id, c.title AS chat_title, m.role, m.created_at,
+           -bm25(messages_fts) AS rank,
+           snippet(messages_fts, 0, '{HIGHLIGHT}', '{HIGHLIGHT}', '…', 16) AS snippet
+    FROM messages_fts
+    JOIN messages m ON m.id = messages_fts.rowid
+    JOIN chats c ON c.id = m.chat_id
+    WHERE messages_fts MATCH :query AND c.user_id = :user_id AND m.role = 'user'
+    ORDER BY bm25(messages_fts), m.id DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+SEARCH_FIELDS = ("id", "chat_id", "chat_title", "role", "created_at", "rank", "snippet")
+
+# typed result columns, so created_at comes back as a datetime on SQLite too
+_SEARCH_COLUMNS = (
+    column("id", Integer), column("chat_id", Integer), column("chat_title", Text), column("role", Text),
+    column("created_at", TIMESTAMP(timezone=True)), column("rank", Float), column("snippet", Text),
+)
+_POSTGRES_SEARCH = _POSTGRES_SEARCH.columns(*_SEARCH_COLUMNS)
+_SQLITE_SEARCH = _SQLITE_SEARCH.columns(*_SEARCH_COLUMNS)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(query: str) -> List[str]:
+    return _WORD.findall(query.lower())
+
+
+def fts5_query(query: str) -> str:
+    """Quote each word so FTS5 operators/syntax in user input are matched literally (AND of all words)."""
+    return " ".join(f'"{term}"' for term in search_terms(query))
+
+
+async def search_messages(database, user_id: int, query: str, limit: int, offset: int = 0):
+    """Rows (SEARCH_FIELDS) of the user's messages matching query, best first."""
+    values = {"user_id": user_id, "limit": limit, "offset": offset}
+    if database.url.dialect == "sqlite":
+        return await database.fetch_all(_SQLITE_SEARCH.bindparams(query=fts5_query(query), **values))
+    return await database.fetch_all(_POSTGRES_SEARCH.bindparams(query=query, **values))
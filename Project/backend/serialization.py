@@ -0,0 +1,41 @@
+# serialization.py
+from typing import Any, Iterable, List, Optional, Sequence
+
+import orjson
+from starlette.responses import Response
+
+# datetimes as RFC 3339 with "Z" for UTC (same as Pydantic), numpy values as plain JSON
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+class ORJSONResponse(Response):
+    """JSON response rendered by orjson; dates, datetimes and numpy values encode natively."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def row_dict(row, fields: Optional[Sequence[str]] = None) -> Optional[dict]:
+    """Plain dict from a databases Record (or a mapping), optionally limited to fields."""
+    if row is None:
+        return None
+    mapping = getattr(row, "_mapping", row)
+    if fields is None:
+        return dict(mapping)
+    return {f: mapping[f] for f in fields}
+
+
+def rows_list(rows: Iterable, fields: Optional[Sequence[str]] = None) -> List[dict]:
+    return [row_dict(r, fields) for r in rows]
+
+
+def json_response(content: Any, status_code: int = 200, headers=None) -> ORJSONResponse:
+    """Response for data already in the right shape (trusted DB rows), skipping
+    the response_model re-validation FastAPI does for plain return values."""
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
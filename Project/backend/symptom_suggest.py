@@ -0,0 +1,125 @@
+# symptom_suggest.py
+import csv
+import heapq
+import os
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from .input_filter import normalize_text
+from .symptom_vocab import symptom_phrase
+
+# sorts after every character that can follow a prefix in a key
+_KEY_END = "\uffff"
+
+
+class SymptomSuggester:
+    """Prefix autocomplete over symptom names, backed by a sorted key array.
+
+    Keys are each symptom's phrase ("skin rash"), every word suffix of it
+    ("rash") and synonym phrases ("throwing up" -> vomiting). A prefix is two
+    bisects into the sorted keys; the symptoms in that range are returned by
+    a precomputed rank: severity weight, then training-set frequency, then
+    name. Symptoms whose phrase itself starts with the prefix come first.
+
+    Only real symptoms get keys: dataset artifacts ("unnamed: 133") never,
+    and when severity or frequency data is given, only symptoms found in it
+    (so non-flag columns such as total_weight, which load_frequency skips,
+    drop out).
+    """
+
+    def __init__(self, symptoms: List[str], weights: Optional[Dict[str, float]] = None,
+                 frequency: Optional[Dict[str, int]] = None, synonyms: Optional[Dict[str, str]] = None):
+        self.symptoms = list(symptoms)
+        self.labels = [symptom_phrase(s) for s in self.symptoms]
+        weights = weights or {}
+        frequency = frequency or {}
+        self.weights = [weights.get(label, 0) for label in self.labels]
+        self.frequency = [frequency.get(label, 0) for label in self.labels]
+
+        order = sorted(range(len(self.symptoms)),
+                       key=lambda i: (-self.weights[i], -self.frequency[i], self.labels[i]))
+        self.rank = [0] * len(self.symptoms)
+        for r, i in enumerate(order):
+            self.rank[i] = r
+
+        has_data = bool(weights or frequency)
+        suggestible = {i for i, label in enumerate(self.labels)
+                       if not label.startswith("unnamed")
+                       and (not has_data or label in weights or label in frequency)}
+
+        entries = set()
+        for i, label in enumerate(self.labels):
+            if i not in suggestible:
+                continue
+            words = label.split()
+            for start in range(len(words)):
+                # whole-phrase matches (start == 0) rank ahead of later-word matches
+                entries.add((" ".join(words[start:]), start > 0, i))
+        position = {s: i for i, s in enumerate(self.symptoms)}
+        for phrase, symptom in (synonyms or {}).items():
+            if position.get(symptom) in suggestible:
+                entries.add((phrase, True, position[symptom]))
+
+        entries = sorted(entries)
+        self.keys = [key for key, _, _ in entries]
+        self.targets = [(later, i) for _, later, i in entries]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[dict]:
+        prefix = normalize_text(prefix.replace("_", " "))
+        if not prefix:
+            return []
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + _KEY_END, lo)
+
+        best = {}
+        for later, i in self.targets[lo:hi]:
+            score = (later, self.rank[i])
+            if i not in best or score < best[i]:
+                best[i] = score
+        top = heapq.nsmallest(limit, best, key=best.__getitem__)
+        return [{
+            "symptom": self.symptoms[i],
+            "label": self.labels[i],
+            "weight": self.weights[i],
+            "frequency": self.frequency[i],
+        } for i in top]
+
+
+def load_severity(path: str) -> Dict[str, float]:
+    """Symptom-severity.csv (Symptom,weight) -> {symptom phrase: weight}."""
+    weights = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            name = (row.get("Symptom") or "").strip()
+            try:
+                weight = float(row.get("weight") or 0)
+            except ValueError:
+                continue
+            if name:
+                weights[symptom_phrase(name)] = int(weight) if weight.is_integer() else weight
+    return weights
+
+
+def load_frequency(path: str) -> Dict[str, int]:
+    """Training CSV -> {symptom phrase: rows with the symptom}, for its 0/1 flag columns only."""
+    df = pd.read_csv(path)
+    df = df.loc[:, ~df.columns.str.lower().str.startswith("unnamed")]
+    flags = df.drop(columns=[c for c in df.columns if c.strip().lower() == "prognosis"])
+    flags = flags.apply(pd.to_numeric, errors="coerce")
+    # aggregates like total_weight aren't symptoms
+    flags = flags.loc[:, flags.isin([0, 1]).all() & flags.notna().any()]
+    return {symptom_phrase(name): int(n) for name, n in flags.gt(0).sum().items()}
+
+
+def build_suggester(symptoms: List[str], severity_path: Optional[str] = None,
+                    training_path: Optional[str] = None,
+                    synonyms: Optional[Dict[str, str]] = None) -> SymptomSuggester:
+    """SymptomSuggester with the severity table and training counts when those files exist."""
+    weights = load_severity(severity_path) if severity_path and os.path.exists(severity_path) else {}
+    frequency = load_frequency(training_path) if training_path and os.path.exists(training_path) else {}
+    return SymptomSuggester(symptoms, weights, frequency, synonyms)
@@ -0,0 +1,153 @@
+# symptom_vocab.py
+import csv
+import os
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from .input_filter import normalize_text
+
+# everyday words within an edit or two of a vocabulary word ("never" -> fever,
+# "again" -> gain, "wheezing" -> sneezing); they are never typo-corrected
+COMMON_WORDS = frozenset("""
+    again black could cover eight feels heard light lived might month never point right
+    round shall sight sleeping stinging sweets three trying water weigh weighs wheezing
+""".split())
+
+
+def symptom_phrase(symptom: str) -> str:
+    """Column name -> the words a user would type, e.g. 'spotting_ urination' -> 'spotting urination'."""
+    return normalize_text(symptom.replace("_", " "))
+
+
+def load_synonyms(path: str) -> Dict[str, str]:
+    """Read a phrase,symptom CSV into {normalized phrase: symptom}."""
+    synonyms = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            phrase = normalize_text(row.get("phrase") or "")
+            symptom = (row.get("symptom") or "").lower().strip()
+            if phrase and symptom:
+                synonyms[phrase] = symptom
+    return synonyms
+
+
+def _grams(text: str, n: int) -> List[str]:
+    padded = f" {text} "
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein (adjacent transpositions) distance, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        prev2, prev = prev, row
+    return prev[-1]
+
+
+class SymptomVocabulary:
+    """Maps normalized free text to symptom indices.
+
+    Matching is a greedy longest-match over word tuples of the symptom names
+    plus the synonym table. Words that aren't in the vocabulary may be typos:
+    a character n-gram inverted index over the known words shortlists
+    candidates, and the closest one within 1 edit (2 for words of
+    long_word+ characters) is the correction. Common English words
+    (COMMON_WORDS) are never corrected, and a correction is only used when
+    it completes a phrase the uncorrected text doesn't. Corrections are
+    memoized, so repeated words cost a dict lookup.
+    """
+
+    def __init__(self, symptoms: List[str], synonyms: Optional[Dict[str, str]] = None,
+                 ngram: int = 3, min_fuzzy_length: int = 5, long_word: int = 8,
+                 shortlist: int = 5, max_memo: int = 50000):
+        self.symptoms = list(symptoms)
+        self.ngram = ngram
+        self.min_fuzzy_length = min_fuzzy_length
+        self.long_word = long_word
+        self.shortlist = shortlist
+        self.max_memo = max_memo
+
+        position = {s: i for i, s in enumerate(self.symptoms)}
+        phrases = {}
+        for i, s in enumerate(self.symptoms):
+            phrases.setdefault(symptom_phrase(s), i)
+        for phrase, symptom in (synonyms or {}).items():
+            if symptom in position:
+                phrases.setdefault(phrase, position[symptom])
+
+        # exact lookup by word tuple
+        self._phrases = {tuple(p.split()): i for p, i in phrases.items() if p}
+        self.max_words = max((len(k) for k in self._phrases), default=0)
+
+        # n-gram -> ids into _words
+        self._words = sorted({w for k in self._phrases for w in k})
+        self._gram_index = defaultdict(list)
+        for word_id, word in enumerate(self._words):
+            for g in set(_grams(word, ngram)):
+                self._gram_index[g].append(word_id)
+
+        # word -> itself for known words, correction (or None) for seen typos
+        self._memo = {w: w for w in self._words}
+
+    def __len__(self):
+        return len(self._phrases)
+
+    def correct(self, word: str) -> Optional[str]:
+        """Known vocabulary word closest to word, or None."""
+        try:
+            return self._memo[word]
+        except KeyError:
+            pass
+
+        best = None
+        if len(word) >= self.min_fuzzy_length and word not in COMMON_WORDS:
+            counts = Counter()
+            for g in set(_grams(word, self.ngram)):
+                counts.update(self._gram_index.get(g, ()))
+            best_distance = 1 if len(word) < self.long_word else 2
+            for word_id, _ in counts.most_common(self.shortlist):
+                candidate = self._words[word_id]
+                distance = edit_distance(word, candidate, best_distance)
+                if distance <= best_distance and (best is None or distance < best_distance):
+                    best, best_distance = candidate, distance
+
+        if len(self._memo) >= self.max_memo:
+            self._memo = {w: w for w in self._words}
+        self._memo[word] = best
+        return best
+
+    def match(self, text: str, fuzzy: bool = True) -> List[int]:
+        """Sorted symptom indices found in already-normalized text."""
+        words = text.split()
+        corrected = [self.correct(w) or w for w in words] if fuzzy else words
+
+        found = set()
+        i = 0
+        while i < len(words):
+            step = 1
+            for n in range(min(self.max_words, len(words) - i), 0, -1):
+                idx = self._phrases.get(tuple(words[i:i + n]))
+                if idx is None and corrected is not words:
+                    idx = self._phrases.get(tuple(corrected[i:i + n]))
+                if idx is not None:
+                    found.add(idx)
+                    step = n
+                    break
+            i += step
+        return sorted(found)
+
+
+def build_vocabulary(symptoms: List[str], synonyms_path: Optional[str] = None) -> SymptomVocabulary:
+    synonyms = {}
+    if synonyms_path and os.path.exists(synonyms_path):
+        synonyms = load_synonyms(synonyms_path)
+    return SymptomVocabulary(symptoms, synonyms)
@@ -5,13 +5,20 @@ import pytest_asyncio
 from unittest.mock import patch, MagicMock, AsyncMock
 import sys
 import os
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+# repo root, so the backend is imported as the Project.backend package (its modules use relative imports)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from main import app
-from auth_utils import create_access_token
+from Project.backend.main import app, rate_limiter, TokenBucketLimiter, MAX_BODY_SIZE
+from Project.backend.main import normalize_input, InputRejected
+from Project.backend.main import model, build_vector_from_text
+from Project.backend.main import chat_symptom_state, SYMPTOMS, admission
+from Project.backend.admission import AdmissionController, Overloaded, PRIORITY_USER, PRIORITY_ANONYMOUS
+from Project.backend.auth_utils import create_access_token
 
 @pytest.fixture
 def client():
+    rate_limiter.reset()
     return TestClient(app)
 
 @pytest.fixture
@@ -26,7 +33,7 @@ def auth_headers(test_user_id):
 @pytest.fixture
 def mock_db():
     """Mock database for testing"""
-    with patch('main.database') as mock:
+    with patch('Project.backend.main.database') as mock:
         mock.connect = AsyncMock()
         mock.disconnect = AsyncMock()
         mock.fetch_one = AsyncMock()
@@ -109,6 +116,99 @@ class TestPredictionEndpoint:
             response = client.post("/predict_text", json={"user_input": input_text})
             assert response.status_code == 400
 
+    def test_predict_apostrophe_allowed(self, client):
+        response = client.post("/predict_text", json={"user_input": "I can't sleep and I have a headache"})
+        assert response.status_code == 200
+        assert "headache" in response.json()["matched_symptoms"]
+
+    def test_normalize_input_policies(self):
+        assert normalize_input("Skin-Rash,  and   ITCHING!") == "skin rash and itching"
+        assert normalize_input("my fever updated overnight") == "my fever updated overnight"
+        with pytest.raises(InputRejected):
+            normalize_input("fever; DROP TABLE users")
+        assert normalize_input("fever; DROP TABLE users --", policy="strip") == "fever table users"
+
+    def test_predict_colloquial_and_typos(self, client):
+        response = client.post("/predict_text", json={
+            "user_input": "I keep throwing up, got a runny nose and a bad hedache"
+        })
+        assert response.status_code == 200
+        assert response.json()["matched_symptoms"] == ["vomiting", "headache", "runny_nose"]
+
+    @pytest.mark.parametrize("user_input", [
+        "I have not been eating well",
+        "I lost weight again",
+        "it could be nothing, I drank water and it feels the same",
+        "never had this before",
+    ])
+    def test_predict_does_not_correct_common_words(self, client, user_input):
+        response = client.post("/predict_text", json={"user_input": user_input})
+        assert response.status_code == 200
+        assert response.json()["matched_symptoms"] == []
+
+    def test_synonym_table_loaded_by_default(self):
+        from Project.backend.main import symptom_vocab, SYMPTOM_SYNONYMS_PATH
+        assert os.path.exists(SYMPTOM_SYNONYMS_PATH)
+        assert len(symptom_vocab) > len(set(SYMPTOMS))
+
+    def test_typo_correction_needs_a_close_match(self):
+        from Project.backend.main import symptom_vocab
+        assert symptom_vocab.correct("hedache") == "headache"
+        assert symptom_vocab.correct("eating") is None
+        assert symptom_vocab.correct("wheezing") is None
+
+    def test_predict_chat_requires_auth(self, client):
+        response = client.post("/predict_text", json={"user_input": "skin rash", "chat_id": 1})
+        assert response.status_code == 401
+
+    def test_predict_accumulates_chat_symptoms(self, client, mock_db, auth_headers, test_user_id):
+        chat_id = 4242
+        chat_symptom_state.forget(chat_id)
+        user_row = {"id": test_user_id}
+        itching, skin_rash = SYMPTOMS.index("itching"), SYMPTOMS.index("skin_rash")
+        chat_row = {"id": chat_id, "symptom_state": chat_symptom_state.pack([itching])}
+        mock_db.fetch_one.side_effect = [user_row, chat_row, {"id": chat_id}]
+
+        response = client.post("/predict_text", json={"user_input": "now a skin rash", "chat_id": chat_id},
+                               headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["matched_symptoms"] == ["skin_rash"]
+        assert data["accumulated_symptoms"] == ["itching", "skin_rash"]
+        assert mock_db.fetch_one.await_count == 3
+
+        # nothing new in the second turn, so nothing to write
+        chat_row = {"id": chat_id, "symptom_state": chat_symptom_state.pack([itching, skin_rash])}
+        mock_db.fetch_one.side_effect = [user_row, chat_row]
+        response = client.post("/predict_text", json={"user_input": "still itching", "chat_id": chat_id},
+                               headers=auth_headers)
+        assert response.json()["accumulated_symptoms"] == ["itching", "skin_rash"]
+        assert mock_db.fetch_one.await_count == 5
+
+    def test_chat_state_write_is_conditional(self):
+        import asyncio
+        from Project.backend.chat_state import ChatSymptomState
+
+        state = ChatSymptomState(len(SYMPTOMS), max_entries=10)
+        database = MagicMock()
+        # read {0}; another worker writes {0, 1} first, so the update misses;
+        # re-read {0, 1}, then the update applies
+        database.fetch_one = AsyncMock(side_effect=[
+            {"id": 7, "symptom_state": state.pack([0])}, None,
+            {"id": 7, "symptom_state": state.pack([0, 1])}, {"id": 7},
+        ])
+        merged = asyncio.run(state.merge(database, 1, 7, [2]))
+        assert merged == [0, 1, 2]
+        assert database.fetch_one.await_count == 4
+        assert state.unpack(state._cache[(1, 7)]) == [0, 1, 2]
+
+    def test_predict_unknown_chat(self, client, mock_db, auth_headers, test_user_id):
+        chat_symptom_state.forget(999)
+        mock_db.fetch_one.side_effect = [{"id": test_user_id}, None]
+        response = client.post("/predict_text", json={"user_input": "skin rash", "chat_id": 999},
+                               headers=auth_headers)
+        assert response.status_code == 404
+
     def test_predict_valid_input(self, client):
         """Test with valid symptom input"""
         response = client.post("/predict_text", json={
@@ -118,6 +218,152 @@ class TestPredictionEndpoint:
         data = response.json()
         assert "predicted_disease" in data
         assert "matched_symptoms" in data
+        assert data["contributions"] is None
+
+    def test_predict_with_explanation(self, client):
+        response = client.post("/predict_text", json={
+            "user_input": "itching, skin rash and chills", "explain": True
+        })
+        assert response.status_code == 200
+        data = response.json()
+        contributions = data["contributions"]
+        assert set(contributions) <= set(data["matched_symptoms"])
+        assert list(contributions.values()) == sorted(contributions.values(), reverse=True)
+
+class TestModelArtifact:
+    """Test the binary model artifact format"""
+
+    def test_round_trip_predictions(self, tmp_path):
+        from Project.backend.model_artifact import load_artifact
+
+        path = tmp_path / "model.dpm"
+        model.save(str(path))
+        loaded = load_artifact(str(path))
+        arr, _ = build_vector_from_text("itching, skin rash and chills")
+        assert list(loaded.classes_) == list(model.classes_)
+        assert list(loaded.feature_names_in_) == list(model.feature_names_in_)
+        assert (loaded.predict_proba(arr) == model.predict_proba(arr)).all()
+
+    def test_corrupted_artifact_rejected(self, tmp_path):
+        from Project.backend.model_artifact import load_artifact, ArtifactError
+
+        path = tmp_path / "model.dpm"
+        model.save(str(path))
+        data = bytearray(path.read_bytes())
+        data[-1] ^= 0xFF
+        path.write_bytes(bytes(data))
+        with pytest.raises(ArtifactError):
+            load_artifact(str(path))
+
+    def test_legacy_pickle_without_feature_names(self, tmp_path):
+        import pickle
+        import numpy as np
+        from Project.backend.model_artifact import load_model
+        from Project.backend.model_router import ServedModel
+        tree = pytest.importorskip("sklearn.tree")
+
+        X = np.eye(len(SYMPTOMS))[:40]
+        y = [f"d{i % 4}" for i in range(40)]
+        legacy = tree.DecisionTreeClassifier(random_state=0).fit(X, y)
+        path = tmp_path / "legacy.pkl"
+        path.write_bytes(pickle.dumps(legacy))
+
+        served = ServedModel("legacy", load_model(str(path), feature_names=SYMPTOMS), SYMPTOMS)
+        vector = served.vector([3])
+        assert vector[0, 3] == 1 and vector.sum() == 1
+        assert served.predict([3])[0] == "d3"
+
+    def test_explanations_add_up_to_probability(self):
+        arr, _ = build_vector_from_text("itching, skin rash and chills")
+        proba, contributions = model.explain(arr)
+        bias = model.value[model.roots].mean(axis=0)
+        assert (proba == model.predict_proba(arr)).all()
+        assert abs(bias + contributions[0].sum(axis=0) - proba[0]).max() < 1e-6
+
+class TestModelRouter:
+    """Test named models, lazy loading and the loaded-model LRU"""
+
+    def make_router(self, tmp_path, max_bytes=0):
+        from Project.backend.model_router import ModelRouter
+
+        paths = {"default": "in-memory"}
+        for name in ("a", "b"):
+            paths[name] = str(tmp_path / f"{name}.dpm")
+            model.save(paths[name])
+        router = ModelRouter(SYMPTOMS, "default", paths, routes={"India": "a"}, max_bytes=max_bytes)
+        router.add("default", model)
+        return router
+
+    def test_lazy_load_and_routes(self, tmp_path):
+        router = self.make_router(tmp_path)
+        assert router.resolve(cohort="india") == "a"
+        assert router.resolve(cohort="Kenya") == "default"
+        assert router.resolve("b", cohort="india") == "b"
+        assert not router.stats()["models"]["a"]["resident"]
+
+        served = router.get("a")
+        arr, _ = build_vector_from_text("itching, skin rash and chills")
+        idx = [SYMPTOMS.index(s) for s in ("itching", "skin_rash", "chills")]
+        assert served.predict(idx)[0] == str(model.predict(arr)[0])
+        router.get("a")
+        stats = router.stats()["models"]["a"]
+        assert stats["resident"] and stats["loads"] == 1 and stats["hits"] == 1
+        assert stats["predictions"] == 1 and stats["p50_ms"] is not None
+
+    def test_lru_evicts_within_budget(self, tmp_path):
+        router = self.make_router(tmp_path)
+        router.max_bytes = router.get("default").nbytes * 2
+        router.get("a")
+        router.get("b")
+        stats = router.stats()
+        assert stats["resident_bytes"] <= router.max_bytes
+        assert stats["models"]["default"]["resident"] and stats["models"]["b"]["resident"]
+        assert not stats["models"]["a"]["resident"]
+        assert stats["models"]["a"]["evictions"] == 1
+
+    def test_cold_load_blocks_only_that_model(self, tmp_path):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from Project.backend.model_artifact import load_model
+
+        router = self.make_router(tmp_path)
+        release, loads = threading.Event(), []
+
+        def slow_loader(path):
+            loads.append(path)
+            release.wait(5)
+            return load_model(path)
+        router.loader = slow_loader
+
+        with ThreadPoolExecutor(2) as pool:
+            pending = [pool.submit(router.get, "a") for _ in range(2)]
+            # the default model is served while "a" is still loading
+            assert router.get("default").name == "default"
+            assert not any(f.done() for f in pending)
+            release.set()
+            assert {f.result().name for f in pending} == {"a"}
+        assert len(loads) == 1
+
+    def test_symptom_names_with_spaces_reach_the_model(self, client):
+        from Project.backend.main import default_model, symptom_vocab, normalize_text
+        spotting = next(s for s in SYMPTOMS if s.startswith("spotting"))
+        idx = symptom_vocab.match(normalize_text("spotting urination"))
+        assert idx == [SYMPTOMS.index(spotting)]
+        column = list(default_model.feature_symptoms).index(spotting)
+        assert default_model.vector(idx)[0, column] == 1
+
+    def test_predict_unknown_model(self, client):
+        response = client.post("/predict_text", json={"user_input": "skin rash", "model": "nope"})
+        assert response.status_code == 404
+
+    def test_models_endpoint(self, client):
+        client.post("/predict_text", json={"user_input": "skin rash"})
+        response = client.get("/models")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["default"] == "default"
+        assert data["models"]["default"]["resident"]
+        assert data["models"]["default"]["predictions"] >= 1
 
 class TestDetailsEndpoint:
     """Test disease details endpoint"""
@@ -139,6 +385,113 @@ class TestDetailsEndpoint:
         response = client.get("/get_details?disease=<script>alert('xss')</script>")
         assert response.status_code == 400
 
+    def test_details_etag_not_modified(self, client):
+        response = client.get("/get_details?disease=Fungal infection")
+        assert response.status_code == 200
+        assert response.json()["precautions"]
+        etag = response.headers["etag"]
+        assert "max-age" in response.headers["cache-control"]
+
+        response = client.get("/get_details?disease=Fungal infection", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+    def test_large_responses_gzipped(self, client, mock_db, auth_headers, test_user_id):
+        from datetime import datetime, timezone
+        created = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        rows = [{"id": i, "user_id": test_user_id, "title": f"Chat {i}", "created_at": created} for i in range(100)]
+        mock_db.fetch_one.side_effect = [{"id": test_user_id}, {"n": 100, "last_id": 99, "last_created": created}]
+        mock_db.fetch_all.return_value = rows
+        response = client.get("/chats", headers={**auth_headers, "Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.json()) == 100
+
+        response = client.get("/get_details?disease=fever", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+
+class TestSymptomSuggest:
+    """Test symptom autocomplete"""
+
+    @pytest.mark.parametrize("prefix", ["tot", "un", "133"])
+    def test_suggest_skips_dataset_columns(self, client, prefix):
+        suggestions = client.get(f"/symptoms/suggest?prefix={prefix}").json()["suggestions"]
+        assert not {"total_weight", "unnamed: 133"} & {s["symptom"] for s in suggestions}
+
+    def test_suggest_ranked_by_severity(self, client):
+        response = client.get("/symptoms/suggest?prefix=fev")
+        assert response.status_code == 200
+        names = [s["symptom"] for s in response.json()["suggestions"]]
+        assert names == ["high_fever", "mild_fever"]
+        assert "max-age" in response.headers["cache-control"]
+
+    def test_suggest_matches_later_words_and_synonyms(self, client):
+        response = client.get("/symptoms/suggest?prefix=Rash")
+        assert [s["symptom"] for s in response.json()["suggestions"]] == ["skin_rash"]
+        response = client.get("/symptoms/suggest?prefix=throwing")
+        assert "vomiting" in [s["symptom"] for s in response.json()["suggestions"]]
+
+    def test_suggest_limit_and_validation(self, client):
+        response = client.get("/symptoms/suggest?prefix=s&limit=3")
+        assert len(response.json()["suggestions"]) == 3
+        assert client.get("/symptoms/suggest?prefix=").status_code == 422
+        assert client.get("/symptoms/suggest?prefix=--").json()["suggestions"] == []
+
+class TestNextQuestion:
+    """Test next-best-question suggestions"""
+
+    def test_questions_ranked_by_information_gain(self, client):
+        response = client.post("/next_question", json={"symptoms": ["itching", "skin rash"], "top": 5})
+        assert response.status_code == 200
+        body = response.json()
+        gains = [q["information_gain"] for q in body["questions"]]
+        assert len(gains) == 5 and gains == sorted(gains, reverse=True)
+        assert not {"itching", "skin_rash"} & {q["symptom"] for q in body["questions"]}
+        assert body["likely_diseases"][0]["probability"] >= body["likely_diseases"][1]["probability"]
+
+    def test_absent_symptoms_not_asked_again(self, client):
+        first = client.post("/next_question", json={"symptoms": ["itching"]}).json()["questions"][0]
+        response = client.post("/next_question", json={"symptoms": ["itching"], "absent": [first["symptom"]]})
+        assert first["symptom"] not in [q["symptom"] for q in response.json()["questions"]]
+
+    def test_returned_symptom_names_accepted(self, client):
+        odd = [s for s in SYMPTOMS if " " in s]
+        response = client.post("/next_question", json={"symptoms": ["itching"], "absent": odd, "top": 20})
+        assert response.status_code == 200
+        questions = [q["symptom"] for q in response.json()["questions"]]
+        assert not set(odd) & set(questions)
+
+        response = client.post("/next_question", json={"symptoms": ["itching"], "absent": questions})
+        assert response.status_code == 200
+        assert not set(questions) & {q["symptom"] for q in response.json()["questions"]}
+
+    def test_unknown_symptom_rejected(self, client):
+        response = client.post("/next_question", json={"symptoms": ["itching", "not_a_symptom"]})
+        assert response.status_code == 400
+        assert "not_a_symptom" in response.json()["detail"]
+
+    def test_gain_matches_direct_computation(self):
+        import numpy as np
+        from Project.backend.main import question_engine as engine
+        present = [SYMPTOMS.index("itching")]
+        post = engine.posterior(present)
+        gain = engine.information_gain(post)
+
+        def entropy(p):
+            p = p[p > 0] / p.sum()
+            return -(p * np.log2(p)).sum()
+        for j in (0, 5, 20):
+            yes, no = post * engine.theta[:, j], post * (1 - engine.theta[:, j])
+            expected = yes.sum() * entropy(yes) + no.sum() * entropy(no)
+            assert abs(gain[j] - (entropy(post) - expected)) < 1e-9
+
+    def test_predict_can_suggest_next(self, client):
+        response = client.post("/predict_text", json={"user_input": "itching and skin rash", "suggest_next": True})
+        assert response.status_code == 200
+        assert response.json()["next_question"]["symptom"] not in ("itching", "skin_rash")
+        response = client.post("/predict_text", json={"user_input": "itching and skin rash"})
+        assert response.json()["next_question"] is None
+
 class TestChatEndpoints:
     """Test chat history endpoints"""
 
@@ -158,6 +511,108 @@ class TestChatEndpoints:
         response = client.delete("/chats/1")
         assert response.status_code == 401
 
+    def test_get_chats_etag(self, client, mock_db, auth_headers, test_user_id):
+        from datetime import datetime, timezone
+        created = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        chat = {"id": 7, "user_id": test_user_id, "title": "Fever", "created_at": created}
+        version = {"n": 1, "last_id": 7, "last_created": created}
+        mock_db.fetch_one.side_effect = [{"id": test_user_id}, version]
+        mock_db.fetch_all.return_value = [chat]
+
+        response = client.get("/chats", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "private, no-cache"
+        etag = response.headers["etag"]
+
+        # unchanged list -> 304 without reading the chats
+        mock_db.fetch_one.side_effect = [{"id": test_user_id}, version]
+        mock_db.fetch_all.reset_mock()
+        response = client.get("/chats", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        mock_db.fetch_all.assert_not_called()
+
+        # a new chat changes the ETag
+        mock_db.fetch_one.side_effect = [{"id": test_user_id}, {**version, "n": 2, "last_id": 8}]
+        response = client.get("/chats", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    def test_get_chat_with_messages_encoding(self, client, mock_db, auth_headers, test_user_id):
+        from datetime import datetime, timezone
+        created = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        chat = {"id": 7, "user_id": test_user_id, "title": "Fever", "created_at": created}
+        message = {"id": 1, "chat_id": 7, "user_id": test_user_id, "role": "user",
+                   "content": "I have a fever", "created_at": created}
+        mock_db.fetch_one.side_effect = [{"id": test_user_id}, chat]
+        mock_db.fetch_all.return_value = [message]
+
+        response = client.get("/chats/7", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json() == {
+            "chat": {**chat, "created_at": "2025-01-02T03:04:05Z"},
+            "messages": [{**message, "created_at": "2025-01-02T03:04:05Z"}],
+        }
+
+    def test_search_messages_unauthorized(self, client):
+        response = client.get("/messages/search?q=fever")
+        assert response.status_code == 401
+
+    def test_search_messages_paginates(self, client, mock_db, auth_headers, test_user_id):
+        from datetime import datetime, timezone
+        created = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        rows = [{"id": i, "chat_id": 7, "chat_title": "Fever", "role": "user", "created_at": created,
+                 "rank": 1.0 / i, "snippet": "high **fever** since yesterday"} for i in (1, 2, 3)]
+        mock_db.fetch_one.return_value = {"id": test_user_id}
+        mock_db.fetch_all.return_value = rows
+
+        response = client.get("/messages/search?q=fever&limit=2", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["id"] for r in data["results"]] == [1, 2]
+        assert data["has_more"] is True
+        assert data["results"][0]["created_at"] == "2025-01-02T03:04:05Z"
+
+    def test_search_messages_needs_words(self, client, mock_db, auth_headers, test_user_id):
+        mock_db.fetch_one.return_value = {"id": test_user_id}
+        response = client.get("/messages/search?q=%22*%20--", headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_search_user_messages_on_sqlite(self, tmp_path):
+        import asyncio
+        import json
+        from datetime import date, datetime
+        from databases import Database
+        from sqlalchemy import create_engine
+        from Project.backend.models import metadata, users, chats, messages
+        from Project.backend.search import search_messages
+
+        url = f"sqlite:///{tmp_path / 'search.db'}"
+        metadata.create_all(create_engine(url))
+
+        async def scenario():
+            database = Database(url)
+            await database.connect()
+            user_id = await database.execute(users.insert().values(
+                full_name="A", dob=date(2000, 1, 1), gender="x", nationality="x", email="a@b.c", password_hash="x"))
+            chat_id = await database.execute(chats.insert().values(user_id=user_id, title="Rash"))
+            await database.execute(messages.insert().values(
+                chat_id=chat_id, user_id=user_id, role="user", content="itchy skin rash on my arm"))
+            await database.execute(messages.insert().values(
+                chat_id=chat_id, user_id=user_id, role="assistant",
+                content=json.dumps({"user_input": "itchy skin rash on my arm", "predicted_disease": "Fungal infection"})))
+            rows = await search_messages(database, user_id, "rash", 10)
+            await database.disconnect()
+            return rows
+
+        rows = asyncio.run(scenario())
+        assert [r["role"] for r in rows] == ["user"]
+        assert "**rash**" in rows[0]["snippet"]
+        assert isinstance(rows[0]["created_at"], datetime)
+
+    def test_fts5_query_quotes_terms(self):
+        from Project.backend.search import fts5_query
+        assert fts5_query('Fever" OR chills*') == '"fever" "or" "chills"'
+
     def test_create_message_unauthorized(self, client):
         response = client.post("/chats/1/messages", json={
             "role": "user",
@@ -187,6 +642,165 @@ class TestUserProfileEndpoints:
         response = client.get("/user/chat-stats")
         assert response.status_code == 401
 
+    def test_export_unauthorized(self, client):
+        response = client.get("/user/export")
+        assert response.status_code == 401
+
+    def export_rows(self, mock_db, test_user_id):
+        from datetime import date, datetime, timezone
+        created = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        mock_db.fetch_one.return_value = {
+            "id": test_user_id, "full_name": "Test User", "email": "test@example.com",
+            "dob": date(2000, 1, 1), "gender": "f", "nationality": "USA", "created_at": created,
+        }
+        rows = [
+            {"chat_id": 7, "chat_title": "Fever", "chat_created_at": created, "message_id": 1,
+             "role": "user", "content": "I have a fever", "message_created_at": created},
+            {"chat_id": 7, "chat_title": "Fever", "chat_created_at": created, "message_id": 2,
+             "role": "assistant", "content": "Rest and fluids", "message_created_at": created},
+            {"chat_id": 8, "chat_title": "Empty", "chat_created_at": created, "message_id": None,
+             "role": None, "content": None, "message_created_at": None},
+        ]
+
+        async def iterate(query):
+            for row in rows:
+                yield row
+
+        mock_db.iterate = iterate
+
+    def test_export_streams_ndjson(self, client, mock_db, auth_headers, test_user_id):
+        import json
+        self.export_rows(mock_db, test_user_id)
+        response = client.get("/user/export", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [(l["type"], l["id"]) for l in lines] == [
+            ("user", test_user_id), ("chat", 7), ("message", 1), ("message", 2), ("chat", 8)]
+        assert lines[2]["chat_id"] == 7 and lines[2]["created_at"] == "2025-01-02T03:04:05Z"
+
+    def test_export_gzip(self, client, mock_db, auth_headers, test_user_id):
+        import gzip
+        self.export_rows(mock_db, test_user_id)
+        response = client.get("/user/export?compress=true", headers={**auth_headers, "Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert "export-user-1.ndjson.gz" in response.headers["content-disposition"]
+        # already gzip: not compressed again by the middleware
+        assert "content-encoding" not in response.headers
+        assert len(gzip.decompress(response.content).splitlines()) == 5
+
+    def test_compressed_responses_bypass_gzip(self):
+        import asyncio
+        import inspect
+        from starlette.middleware.gzip import GZipMiddleware
+        from Project.backend.http_cache import SelectiveGZipMiddleware
+
+        # switch off Starlette's own content-type exclusions where it has them
+        options = {"minimum_size": 100}
+        if "exclude_content_types" in inspect.signature(GZipMiddleware).parameters:
+            options["exclude_content_types"] = ()
+
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", scope["path"][1:].encode())]})
+            await send({"type": "http.response.body", "body": b"x" * 2000})
+
+        async def call(content_type):
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+            scope = {"type": "http", "path": "/" + content_type, "headers": [(b"accept-encoding", b"gzip")]}
+            await SelectiveGZipMiddleware(app, **options)(scope, None, send)
+            return dict(sent[0]["headers"]), sent[1]["body"]
+
+        headers, body = asyncio.run(call("application/gzip"))
+        assert b"content-encoding" not in headers and body == b"x" * 2000
+        headers, body = asyncio.run(call("text/plain"))
+        assert headers[b"content-encoding"] == b"gzip" and len(body) < 2000
+
+class TestChatWebSocket:
+    """Test the chat WebSocket channel"""
+
+    def test_rejects_bad_token(self, client):
+        from starlette.websockets import WebSocketDisconnect
+        with client.websocket_connect("/ws/chat") as ws:
+            ws.send_json({"type": "auth", "token": "invalid"})
+            with pytest.raises(WebSocketDisconnect) as exc:
+                ws.receive_json()
+        assert exc.value.code == 4401
+
+    def test_turn_with_rate_limit_disabled(self, client, mock_db, test_user_id):
+        from datetime import datetime, timezone
+        created = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        chat = {"id": 4344, "user_id": test_user_id, "title": "chills", "created_at": created}
+        messages = [{"id": i, "chat_id": 4344, "user_id": test_user_id, "role": "user",
+                     "content": "", "created_at": created} for i in (1, 2)]
+        mock_db.fetch_one.side_effect = [{"id": test_user_id}, chat, *messages]
+        token = create_access_token(subject=str(test_user_id))
+        with patch.object(rate_limiter, "rate", 0.0), patch.object(rate_limiter, "capacity", 0.0):
+            with client.websocket_connect("/ws/chat") as ws:
+                ws.send_json({"type": "auth", "token": token})
+                assert ws.receive_json()["type"] == "ready"
+                ws.send_json({"type": "predict", "id": "a", "user_input": "chills"})
+                assert ws.receive_json()["type"] == "prediction"
+        chat_symptom_state.forget(4344)
+
+    def test_closes_once_token_expires(self, client, mock_db, test_user_id):
+        from starlette.websockets import WebSocketDisconnect
+        mock_db.fetch_one.return_value = {"id": test_user_id}
+        token = create_access_token(subject=str(test_user_id), expires_seconds=60)
+        with client.websocket_connect("/ws/chat") as ws:
+            ws.send_json({"type": "auth", "token": token})
+            assert ws.receive_json()["type"] == "ready"
+            with patch("Project.backend.main.time") as clock:
+                clock.time.return_value = time.time() + 120
+                ws.send_json({"type": "predict", "id": "a", "user_input": "chills"})
+                with pytest.raises(WebSocketDisconnect) as exc:
+                    ws.receive_json()
+        assert exc.value.code == 4401
+        # auth lookup only; nothing was written after expiry
+        assert mock_db.fetch_one.await_count == 1
+
+    def test_chat_turns(self, client, mock_db, test_user_id):
+        from datetime import datetime, timezone
+        created = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        chat = {"id": 4343, "user_id": test_user_id, "title": "itching and skin rash", "created_at": created}
+
+        def message(i):
+            return {"id": i, "chat_id": 4343, "user_id": test_user_id, "role": "user",
+                    "content": "", "created_at": created}
+
+        state = chat_symptom_state.pack([SYMPTOMS.index("itching"), SYMPTOMS.index("skin_rash")])
+        # auth, new chat, 2 messages, then chat state read + update and 2 messages for the second turn
+        mock_db.fetch_one.side_effect = [{"id": test_user_id, "nationality": "USA"}, chat,
+                                         message(1), message(2), {"id": 4343, "symptom_state": state},
+                                         {"id": 4343}, message(3), message(4)]
+        token = create_access_token(subject=str(test_user_id))
+        with client.websocket_connect("/ws/chat") as ws:
+            ws.send_json({"type": "auth", "token": token})
+            assert ws.receive_json() == {"type": "ready", "user_id": test_user_id}
+
+            ws.send_json({"type": "predict", "id": "a", "user_input": "itching and skin rash"})
+            first = ws.receive_json()
+            assert first["type"] == "prediction" and first["id"] == "a"
+            assert first["chat"]["id"] == first["chat_id"] == 4343
+            assert first["message_ids"] == {"user": 1, "assistant": 2}
+            assert first["details"]["disease"] == first["prediction"]["predicted_disease"]
+
+            ws.send_json({"type": "predict", "id": "b", "user_input": "chills", "chat_id": 4343})
+            second = ws.receive_json()
+            assert second["chat"] is None
+            assert second["prediction"]["accumulated_symptoms"] == ["itching", "skin_rash", "chills"]
+            assert second["message_ids"] == {"user": 3, "assistant": 4}
+
+            ws.send_json({"type": "predict", "id": "c", "user_input": "drop table users"})
+            assert ws.receive_json() == {"type": "error", "id": "c", "status": 400,
+                                         "detail": "Invalid characters in input"}
+        # one user lookup for the whole connection
+        assert mock_db.fetch_one.call_count == 8
+        chat_symptom_state.forget(4343)
+
 class TestInputValidation:
     """Test input validation across all endpoints"""
 
@@ -227,6 +841,123 @@ class TestRateLimiting:
             response = client.get("/")
             assert response.status_code == 200
 
+    def test_bucket_exhaustion_and_refill(self):
+        limiter = TokenBucketLimiter(rate_per_minute=60, burst=2)
+        assert limiter.allow("ip:1", now=0.0) == 0
+        assert limiter.allow("ip:1", now=0.0) == 0
+        assert limiter.allow("ip:1", now=0.0) == pytest.approx(1.0)
+        # other clients have their own bucket
+        assert limiter.allow("ip:2", now=0.0) == 0
+        # one token per second at 60/min
+        assert limiter.allow("ip:1", now=1.0) == 0
+
+    def test_idle_buckets_evicted(self):
+        limiter = TokenBucketLimiter(rate_per_minute=60, shards=1, sweep_interval=1)
+        limiter.allow("ip:1", now=0.0)
+        assert len(limiter) == 1
+        limiter.allow("ip:2", now=120.0)
+        assert len(limiter) == 1
+
+    def test_requests_over_limit_rejected(self, client):
+        responses = [client.get("/") for _ in range(int(rate_limiter.capacity) + 1)]
+        assert responses[-1].status_code == 429
+        assert "retry-after" in responses[-1].headers
+
+    def test_oversized_body_rejected(self, client):
+        response = client.post("/predict_text", content=b"x" * (MAX_BODY_SIZE + 1),
+                               headers={"Content-Type": "application/json"})
+        assert response.status_code == 413
+
+class TestAdmissionControl:
+    """Test inference admission control and load shedding"""
+
+    def test_queue_order_eviction_and_rejection(self):
+        import asyncio
+
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=5)
+            order = []
+
+            async def request(name, priority):
+                try:
+                    async with controller.slot(priority):
+                        order.append(name)
+                        await asyncio.sleep(0.01)
+                except Overloaded as e:
+                    order.append(f"{name}:{e.reason}")
+
+            await controller.acquire(PRIORITY_USER)
+            tasks = [asyncio.create_task(request("anon1", PRIORITY_ANONYMOUS)),
+                     asyncio.create_task(request("anon2", PRIORITY_ANONYMOUS))]
+            await asyncio.sleep(0)
+            # queue is full: another anonymous caller is turned away, a user bumps the newest anonymous one
+            tasks.append(asyncio.create_task(request("anon3", PRIORITY_ANONYMOUS)))
+            tasks.append(asyncio.create_task(request("user", PRIORITY_USER)))
+            await asyncio.sleep(0)
+            controller.release()
+            await asyncio.gather(*tasks)
+            return order, controller
+
+        order, controller = asyncio.run(scenario())
+        assert order == ["anon3:rejected", "anon2:evicted", "user", "anon1"]
+        stats = controller.stats()
+        assert stats["in_flight"] == 0 and stats["shed"] == 2
+        assert stats["by_priority"]["anonymous"]["evicted"] == 1
+        assert stats["by_priority"]["user"]["admitted"] == 2
+
+    def test_user_not_blocked_by_cancelled_anonymous_waiter(self):
+        import asyncio
+
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=5)
+            await controller.acquire(PRIORITY_USER)
+            anonymous = asyncio.create_task(controller.acquire(PRIORITY_ANONYMOUS))
+            await asyncio.sleep(0)
+            anonymous.cancel()
+            await asyncio.sleep(0)
+            # the cancelled waiter's future is done but may still be queued
+            user = asyncio.create_task(controller.acquire(PRIORITY_USER))
+            await asyncio.sleep(0)
+            controller.release()
+            await user
+            with pytest.raises(asyncio.CancelledError):
+                await anonymous
+            controller.release()
+            return controller
+
+        controller = asyncio.run(scenario())
+        assert controller.in_flight == 0 and controller.queued == 0
+        assert controller.counts["anonymous"]["evicted"] == 0
+        assert controller.counts["user"]["rejected"] == 0
+        assert controller.counts["user"]["admitted"] == 2
+
+    def test_queue_timeout(self):
+        import asyncio
+
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=0.01)
+            await controller.acquire(PRIORITY_USER)
+            with pytest.raises(Overloaded) as e:
+                await controller.acquire(PRIORITY_USER)
+            controller.release()
+            return e.value, controller
+
+        error, controller = asyncio.run(scenario())
+        assert error.reason == "timed_out"
+        assert controller.queued == 0 and controller.in_flight == 0
+
+    def test_predict_shed_with_503(self, client):
+        admission.reset_stats()
+        with patch.object(admission, "max_concurrent", 1), patch.object(admission, "max_queue", 0), \
+                patch.object(admission, "in_flight", 1):
+            response = client.post("/predict_text", json={"user_input": "I have a fever"})
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == str(admission.retry_after)
+
+        metrics = client.get("/metrics/admission").json()
+        assert metrics["by_priority"]["anonymous"]["rejected"] == 1
+        assert client.post("/predict_text", json={"user_input": "I have a fever"}).status_code == 200
+
 class TestAuthenticationHeader:
     """Test authentication header validation"""
 
@@ -235,12 +966,12 @@ class TestAuthenticationHeader:
         assert response.status_code == 401
 
     def test_invalid_token_format(self, client):
-        response = client.get("/chats", headers={"Authorization": "Bearer"}})
+        response = client.get("/chats", headers={"Authorization": "Bearer"})
         assert response.status_code == 401
 
     def test_expired_token(self, client):
         """Test with expired token"""
-        from auth_utils import create_access_token
+        from Project.backend.auth_utils import create_access_token
         import time
         expired_token = create_access_token(subject="1", expires_seconds=-1)
         response = client.get("/chats", headers={"Authorization": f"Bearer {expired_token}"})
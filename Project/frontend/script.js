@@ -1,9 +1,15 @@
 const API_BASE = 'http://127.0.0.1:8000';
+const WS_BASE = API_BASE.replace(/^http/, 'ws');
 
 let currentChatId = null;
 let currentUser = null;
 let chatHistory = [];
 
+// One authenticated socket carries chat turns; HTTP is used if it can't connect
+let chatSocketReady = null;
+let nextTurnId = 1;
+const pendingTurns = new Map();
+
 const getAuthHeaders = () => {
     const token = localStorage.getItem('sao_token');
     return token ? { 'Authorization': `Bearer ${token}` } : {};
@@ -204,6 +210,101 @@ const formatPredictionContent = (prediction) => {
     return `<div class="prediction-result">${html}</div>`;
 };
 
+const openChatSocket = () => {
+    if (chatSocketReady) return chatSocketReady;
+
+    chatSocketReady = new Promise((resolve, reject) => {
+        const socket = new WebSocket(`${WS_BASE}/ws/chat`);
+        socket.onopen = () => {
+            socket.send(JSON.stringify({ type: 'auth', token: localStorage.getItem('sao_token') }));
+        };
+        socket.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            if (data.type === 'ready') {
+                resolve(socket);
+                return;
+            }
+            const pending = pendingTurns.get(data.id);
+            if (!pending) return;
+            pendingTurns.delete(data.id);
+            if (data.type === 'error') {
+                pending.reject(new Error(typeof data.detail === 'string' ? data.detail : 'Prediction failed'));
+            } else {
+                pending.resolve(data);
+            }
+        };
+        socket.onclose = () => {
+            chatSocketReady = null;
+            reject(new Error('Chat connection closed'));
+            pendingTurns.forEach(pending => pending.reject(new Error('Chat connection closed')));
+            pendingTurns.clear();
+        };
+    });
+    return chatSocketReady;
+};
+
+// Predict + persist one turn over the socket; creates the chat when there is none yet
+const sendTurnOverSocket = (socket, message) => new Promise((resolve, reject) => {
+    const id = nextTurnId++;
+    pendingTurns.set(id, { resolve, reject });
+    socket.send(JSON.stringify({ type: 'predict', id, user_input: message, chat_id: currentChatId }));
+});
+
+const sendTurnOverHttp = async (message) => {
+    if (!currentChatId) {
+        const createResponse = await fetch(`${API_BASE}/chats`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                ...getAuthHeaders()
+            },
+            body: JSON.stringify({ title: message.slice(0, 50) + (message.length > 50 ? '...' : '') })
+        });
+
+        if (!createResponse.ok) throw new Error('Failed to create chat');
+        const chatData = await createResponse.json();
+        currentChatId = chatData.id;
+        document.getElementById('currentChatTitle').textContent = chatData.title || 'New chat';
+        await loadChatHistory();
+    }
+
+    const response = await fetch(`${API_BASE}/predict_text`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            ...getAuthHeaders()
+        },
+        body: JSON.stringify({ user_input: message, chat_id: currentChatId })
+    });
+
+    if (!response.ok) {
+        const error = await response.json().catch(() => ({ detail: 'Prediction failed' }));
+        throw new Error(error.detail || 'Prediction failed');
+    }
+
+    const prediction = await response.json();
+
+    await fetch(`${API_BASE}/chats/${currentChatId}/messages`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            ...getAuthHeaders()
+        },
+        body: JSON.stringify({ role: 'user', content: message })
+    });
+
+    await fetch(`${API_BASE}/chats/${currentChatId}/messages`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            ...getAuthHeaders()
+        },
+        body: JSON.stringify({ role: 'assistant', content: JSON.stringify(prediction) })
+    });
+
+    return prediction;
+};
+
 const sendMessage = async () => {
     const input = document.getElementById('chatInput');
     const message = input.value.trim();
@@ -222,63 +323,23 @@ const sendMessage = async () => {
     scrollToBottom();
 
     try {
-        if (!currentChatId) {
-            const createResponse = await fetch(`${API_BASE}/chats`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    ...getAuthHeaders()
-                },
-                body: JSON.stringify({ title: message.slice(0, 50) + (message.length > 50 ? '...' : '') })
-            });
-
-            if (!createResponse.ok) throw new Error('Failed to create chat');
-            const chatData = await createResponse.json();
-            currentChatId = chatData.id;
-            document.getElementById('currentChatTitle').textContent = chatData.title || 'New chat';
-            await loadChatHistory();
+        const socket = await openChatSocket().catch(() => null);
+        let prediction;
+
+        if (socket) {
+            const turn = await sendTurnOverSocket(socket, message);
+            if (turn.chat) {
+                currentChatId = turn.chat.id;
+                document.getElementById('currentChatTitle').textContent = turn.chat.title || 'New chat';
+                await loadChatHistory();
+            }
+            prediction = { ...turn.prediction, precautions: turn.details.precautions };
+        } else {
+            prediction = await sendTurnOverHttp(message);
         }
 
-        const response = await fetch(`${API_BASE}/predict_text`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                ...getAuthHeaders()
-            },
-            body: JSON.stringify({ user_input: message })
-        });
-
         typingIndicator.classList.add('hidden');
-
-        if (!response.ok) {
-            const error = await response.json().catch(() => ({ detail: 'Prediction failed' }));
-            throw new Error(error.detail || 'Prediction failed');
-        }
-
-        const prediction = await response.json();
-
         appendMessage('assistant', prediction, true);
-
-        if (currentChatId) {
-            await fetch(`${API_BASE}/chats/${currentChatId}/messages`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    ...getAuthHeaders()
-                },
-                body: JSON.stringify({ role: 'user', content: message })
-            });
-
-            await fetch(`${API_BASE}/chats/${currentChatId}/messages`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    ...getAuthHeaders()
-                },
-                body: JSON.stringify({ role: 'assistant', content: JSON.stringify(prediction) })
-            });
-        }
-
         scrollToBottom();
 
     } catch (error) {
@@ -0,0 +1,206 @@
+"""Score large CSV / NDJSON files offline with the backend's model and symptom matcher.
+
+Rows are streamed in chunks and fanned out over a process pool; predictions
+are written as they come back, in input order. A row is scored from its text
+column when there is one (same matcher as /predict_text), otherwise from
+symptom columns holding 0/1 flags (the layout of Testing.csv).
+
+Run from the project root:
+
+    python3 Project/model/batch_score.py Project/data/Testing.csv predictions.csv
+    python3 Project/model/batch_score.py intake.ndjson out.ndjson --text-column user_input --workers 8
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.input_filter import normalize_text
+from backend.model_artifact import load_model
+from backend.symptom_vocab import build_vocabulary
+
+DEFAULT_MODEL = "Project/model/disease_model.dpm"
+TEXT_COLUMNS = ("text", "user_input")
+
+# per-process state, set by _init_worker
+_scorer = None
+
+
+class Scorer:
+    def __init__(self, model_path, synonyms_path=None, text_column=None, label_column="prognosis"):
+        self.model = load_model(model_path)
+        self.features = [str(f).lower().strip() for f in self.model.feature_names_in_]
+        self.feature_pos = {f: i for i, f in enumerate(self.features)}
+        self.vocab = build_vocabulary(self.features, synonyms_path)
+        self.text_column = text_column
+        self.label_column = label_column
+
+    def _text_column(self, keys):
+        if self.text_column:
+            return self.text_column if self.text_column in keys else None
+        return next((c for c in TEXT_COLUMNS if c in keys), None)
+
+    def score(self, rows):
+        """rows: list of dicts. Returns one output dict per row."""
+        if not rows:
+            return []
+        X = np.zeros((len(rows), len(self.features)), dtype=np.float64)
+        matched = [None] * len(rows)
+
+        for r, row in enumerate(rows):
+            text_col = self._text_column(row)
+            if text_col is not None:
+                idx = self.vocab.match(normalize_text(str(row.get(text_col) or "")))
+                X[r, idx] = 1
+                matched[r] = [self.features[i] for i in idx]
+            else:
+                for key, value in row.items():
+                    pos = self.feature_pos.get(str(key).lower().strip())
+                    if pos is not None and str(value).strip() not in ("", "0", "0.0"):
+                        X[r, pos] = 1
+
+        # intake rows repeat a lot; run the model once per distinct symptom vector
+        unique, inverse = np.unique(X, axis=0, return_inverse=True)
+        probs = self.model.predict_proba(unique)[inverse.ravel()]
+        best = np.argmax(probs, axis=1)
+        out = []
+        for r, row in enumerate(rows):
+            item = {
+                "predicted_disease": str(self.model.classes_[best[r]]),
+                "probability": round(float(probs[r, best[r]]), 6),
+            }
+            if matched[r] is not None:
+                item["matched_symptoms"] = matched[r]
+            if self.label_column in row:
+                item["label"] = str(row[self.label_column]).strip()
+            out.append(item)
+        return out
+
+
+def _init_worker(model_path, synonyms_path, text_column, label_column):
+    global _scorer
+    _scorer = Scorer(model_path, synonyms_path, text_column, label_column)
+
+
+def _score_chunk(rows):
+    return _scorer.score(rows)
+
+
+def read_chunks(path, chunk_size):
+    """Yield lists of row dicts without loading the whole file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+class Writer:
+    def __init__(self, path):
+        self.ndjson = path.endswith((".ndjson", ".jsonl"))
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.csv = None
+        self.row = 0
+
+    def write(self, results):
+        for item in results:
+            item = {"row": self.row, **item}
+            self.row += 1
+            if self.ndjson:
+                self.f.write(json.dumps(item) + "\n")
+                continue
+            if "matched_symptoms" in item:
+                item["matched_symptoms"] = ";".join(item["matched_symptoms"])
+            if self.csv is None:
+                fields = ["row", "predicted_disease", "probability", "matched_symptoms", "label"]
+                self.csv = csv.DictWriter(self.f, fieldnames=fields)
+                self.csv.writeheader()
+            self.csv.writerow(item)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class _Done(Future):
+    """Already-resolved future used when scoring in-process (--workers 0)."""
+
+    def __init__(self, value):
+        super().__init__()
+        self.set_result(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="CSV or NDJSON (.ndjson/.jsonl) file")
+    parser.add_argument("output", help="CSV or NDJSON (.ndjson/.jsonl) file")
+    parser.add_argument("--model", default=os.environ.get("MODEL_PATH", DEFAULT_MODEL))
+    parser.add_argument("--synonyms", default=os.environ.get("SYMPTOM_SYNONYMS_PATH"),
+                        help="phrase,symptom CSV (default: symptom_synonyms.csv next to the model)")
+    parser.add_argument("--text-column", default=None,
+                        help="column with free text (default: text or user_input if present)")
+    parser.add_argument("--label-column", default="prognosis")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes; 0 scores in this process")
+    args = parser.parse_args(argv)
+
+    synonyms = args.synonyms or os.path.join(os.path.dirname(args.model), "symptom_synonyms.csv")
+    init_args = (args.model, synonyms, args.text_column, args.label_column)
+
+    pool = None
+    if args.workers > 0:
+        pool = ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=init_args)
+    else:
+        _init_worker(*init_args)
+
+    writer = Writer(args.output)
+    pending = deque()
+    max_pending = max(2, args.workers * 2)
+    total = correct = labelled = 0
+    start = time.perf_counter()
+
+    def drain(until):
+        nonlocal total, correct, labelled
+        while len(pending) > until:
+            results = pending.popleft().result()
+            writer.write(results)
+            total += len(results)
+            for item in results:
+                if "label" in item:
+                    labelled += 1
+                    correct += item["label"] == item["predicted_disease"]
+            elapsed = time.perf_counter() - start
+            print(f"\r{total:,} rows  {total / elapsed:,.0f} rows/s", end="", file=sys.stderr)
+
+    try:
+        for chunk in read_chunks(args.input, args.chunk_size):
+            pending.append(pool.submit(_score_chunk, chunk) if pool else _Done(_score_chunk(chunk)))
+            drain(max_pending)
+        drain(0)
+    finally:
+        writer.close()
+        if pool:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - start
+    print(f"\r{total:,} rows in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)", file=sys.stderr)
+    if labelled:
+        print(f"Accuracy vs {args.label_column}: {correct / labelled * 100:.2f}% ({correct}/{labelled})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Compare smaller variants of the disease model and report the trade-offs.
+
+Candidates:
+  * forests with fewer trees and/or limited depth
+  * the full forest pruned to its best-k trees (ranked on a validation split)
+  * a single decision tree distilled from the forest's predictions
+
+Each is scored on Testing.csv (accuracy), timed through the same NumPy
+inference the backend uses (p50/p99 single-row predict_proba) and written
+as an artifact to measure its size. Candidates on the Pareto frontier
+(nothing else is at least as accurate, as fast at p99 and as small) are
+marked with *.
+
+Run from the project root:
+
+    python3 Project/model/compress_model.py
+    python3 Project/model/compress_model.py --save "prune-25" --out Project/model/disease_model.dpm
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.tree import DecisionTreeClassifier
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.model_artifact import ForestModel
+
+SEED = 42
+
+
+def load_data(train_path, test_path):
+    test = pd.read_csv(test_path)
+    test = test.loc[:, ~test.columns.str.lower().str.startswith("unnamed")]
+    features = [c for c in test.columns if c != "prognosis"]
+
+    train = pd.read_csv(train_path)
+    train.columns = [c.strip() for c in train.columns]
+    X = train.reindex(columns=features, fill_value=0).to_numpy(dtype=np.float64)
+    y = train["prognosis"].astype(str).str.strip().to_numpy()
+    X_test = test[features].to_numpy(dtype=np.float64)
+    y_test = test["prognosis"].astype(str).str.strip().to_numpy()
+    return features, X, y, X_test, y_test
+
+
+def subforest(forest, features, tree_ids, name):
+    """ForestModel from a subset of a fitted forest's trees."""
+    full = ForestModel.from_sklearn(forest, features)
+    bounds = list(full.roots) + [len(full.left)]
+    parts = {k: [] for k in ForestModel.ARRAYS}
+    offset, roots = 0, []
+    for t in tree_ids:
+        start, stop = bounds[t], bounds[t + 1]
+        shift = offset - start
+        left, right = full.left[start:stop], full.right[start:stop]
+        parts["left"].append(np.where(left >= 0, left + shift, -1))
+        parts["right"].append(np.where(right >= 0, right + shift, -1))
+        parts["feature"].append(full.feature[start:stop])
+        parts["threshold"].append(full.threshold[start:stop])
+        parts["value"].append(full.value[start:stop])
+        roots.append(offset)
+        offset += stop - start
+    arrays = {k: np.concatenate(v) for k, v in parts.items() if v}
+    arrays["roots"] = np.array(roots, dtype=np.int32)
+    return ForestModel(arrays, list(full.classes_), features, full.max_depth, {"candidate": name})
+
+
+def distill(forest, X, n_synthetic, max_depth, rng):
+    """Fit one tree on the forest's labels for the training rows plus noisy copies of them."""
+    idx = rng.integers(0, len(X), n_synthetic)
+    noisy = X[idx].copy()
+    flips = rng.random(noisy.shape) < 0.02
+    noisy[flips] = 1 - noisy[flips]
+    X_aug = np.vstack([X, noisy])
+    tree = DecisionTreeClassifier(max_depth=max_depth, random_state=SEED)
+    tree.fit(X_aug, forest.predict(X_aug))
+    return tree
+
+
+def build_candidates(features, X, y, args):
+    rng = np.random.default_rng(SEED)
+    X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=0.2, random_state=SEED)
+
+    def forest(n_estimators, max_depth=None):
+        return RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth,
+                                      random_state=SEED, n_jobs=-1).fit(X_fit, y_fit)
+
+    baseline = forest(150)
+    yield "rf-150 (baseline)", ForestModel.from_sklearn(baseline, features)
+
+    for n in (50, 25, 10):
+        yield f"rf-{n}", ForestModel.from_sklearn(forest(n), features)
+    for depth in (20, 12, 8):
+        yield f"rf-50 depth<={depth}", ForestModel.from_sklearn(forest(50, depth), features)
+
+    # rank the baseline's trees by validation accuracy and keep the best k
+    classes = baseline.classes_
+    scores = [np.mean(classes[t.predict(X_val).astype(int)] == y_val) for t in baseline.estimators_]
+    ranked = list(np.argsort(scores)[::-1])
+    for k in (50, 25, 10):
+        yield f"prune-{k}", subforest(baseline, features, sorted(ranked[:k]), f"prune-{k}")
+
+    for depth in (None, 16, 10):
+        label = "distilled tree" + (f" depth<={depth}" if depth else "")
+        tree = distill(baseline, X_fit, args.synthetic, depth, rng)
+        yield label, ForestModel.from_sklearn(tree, features)
+
+
+def latency_us(model, X_test, repeats):
+    rows = [X_test[i % len(X_test)][None, :] for i in range(repeats)]
+    timings = np.empty(repeats)
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings[i] = time.perf_counter() - start
+    return np.percentile(timings, 50) * 1e6, np.percentile(timings, 99) * 1e6
+
+
+def artifact_size(model):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "candidate.dpm")
+        model.save(path)
+        return os.path.getsize(path)
+
+
+def pareto(rows):
+    """Indices of rows not dominated on (accuracy up, p99 down, size down)."""
+    front = []
+    for i, a in enumerate(rows):
+        dominated = any(
+            b["accuracy"] >= a["accuracy"] and b["p99"] <= a["p99"] and b["size"] <= a["size"]
+            and (b["accuracy"] > a["accuracy"] or b["p99"] < a["p99"] or b["size"] < a["size"])
+            for j, b in enumerate(rows) if j != i
+        )
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare compressed variants of the disease model.")
+    parser.add_argument("--train", default="Project/data/Combined_Training.csv")
+    parser.add_argument("--test", default="Project/data/Testing.csv")
+    parser.add_argument("--repeats", type=int, default=500, help="single-row predictions timed per candidate")
+    parser.add_argument("--synthetic", type=int, default=20000, help="extra noisy rows for distillation")
+    parser.add_argument("--save", metavar="NAME", help="write the candidate with this name as an artifact")
+    parser.add_argument("--out", default="Project/model/disease_model.dpm")
+    args = parser.parse_args(argv)
+
+    features, X, y, X_test, y_test = load_data(args.train, args.test)
+
+    rows, models = [], {}
+    for name, model in build_candidates(features, X, y, args):
+        p50, p99 = latency_us(model, X_test, args.repeats)
+        rows.append({
+            "name": name,
+            "trees": model.n_trees,
+            "nodes": len(model.left),
+            "accuracy": float(np.mean(model.predict(X_test) == y_test)),
+            "p50": p50,
+            "p99": p99,
+            "size": artifact_size(model),
+        })
+        models[name] = model
+
+    front = set(pareto(rows))
+    print(f"\n   {'candidate':<26}{'trees':>6}{'nodes':>8}{'test acc':>10}{'p50 us':>9}{'p99 us':>9}{'size KB':>10}")
+    for i, r in enumerate(rows):
+        mark = "*" if i in front else " "
+        print(f" {mark} {r['name']:<26}{r['trees']:>6}{r['nodes']:>8}{r['accuracy'] * 100:>9.2f}%"
+              f"{r['p50']:>9.0f}{r['p99']:>9.0f}{r['size'] / 1024:>10.0f}")
+    print(f"\n* = Pareto frontier (accuracy on {len(y_test)} rows of {os.path.basename(args.test)})")
+
+    if args.save:
+        if args.save not in models:
+            parser.error(f"unknown candidate {args.save!r}; choose from: {', '.join(models)}")
+        model = models[args.save]
+        model.metadata = {"candidate": args.save, "test_accuracy": next(
+            r["accuracy"] for r in rows if r["name"] == args.save)}
+        model.save(args.out)
+        print(f"✅ Saved {args.save} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
+import os
+import sys
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score
 import pickle
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.model_artifact import save_model_artifact
+
 # Load dataset
 df = pd.read_csv("Project/data/Training.csv")
 
@@ -29,3 +34,7 @@ with open("disease_model.pkl", "wb") as file:
     pickle.dump(model, file)
 
 print("💾 Model saved as disease_model.pkl")
+
+save_model_artifact(model, "disease_model.dpm", feature_names=list(X.columns),
+                    metadata={"trained_on": "Training.csv", "accuracy": float(acc)})
+print("💾 Model artifact saved as disease_model.dpm")
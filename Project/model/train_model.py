@@ -1,8 +1,13 @@
+import os
+import sys
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 import pickle
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.model_artifact import save_model_artifact
+
 # Load combined dataset
 df = pd.read_csv("Project/data/Combined_Training.csv")
 
@@ -27,6 +32,10 @@ print(f"Accuracy: {acc * 100:.2f}%")
 with open("model/disease_model.pkl", "wb") as f:
     pickle.dump(model, f)
 
+# Save compact artifact for the backend (loads without pickle/sklearn)
+save_model_artifact(model, "Project/model/disease_model.dpm", feature_names=list(X.columns),
+                    metadata={"trained_on": "Combined_Training.csv", "accuracy": float(acc)})
+
 # Save symptom list for backend
 with open("model/symptoms_list.txt", "w") as f:
     f.write("\n".join(list(X.columns)))